@@ -1,28 +1,72 @@
 import ollama
 import os
-from main import main
+import asyncio
+import hashlib
+import json
+import sys
+from main import iter_analyses, record_project_run, render_dockerfile_template, ResponseCache
+from main import assemble_structured_dockerfile, canonical_description, DOCKERFILE_SCHEMA
+from main import DOCKERFILE_BASE_IMAGES, TEMPLATE_VERSION
 
-# Analyze projects
-analyses = main()
+# Model configuration
+MODEL = "codegemma:7b"
 
-# Check if any projects were found
-if not analyses or len(analyses) == 0:
-    print("No projects found in the directory.")
-    print("Please make sure there are project directories to analyze.")
-    exit(1)
+# Small, fast model for simple well-classified projects; unknown, mixed-language or large ones use MODEL
+FAST_MODEL = "qwen2.5-coder:1.5b"
 
-first_project = analyses[0]
+# Models tried in order for each kind of project, the next one is used when a model is missing or too slow
+MODEL_CHAINS = {
+    'simple': [FAST_MODEL, MODEL],
+    'complex': [MODEL]
+}
 
-# Extract project name from the description
-# The description format is: "The project 'project-name':"
-description = first_project['description']
-project_name = description.split("'")[1]  # Extract name between single quotes
+# Projects with more source files than this are considered complex
+COMPLEX_PROJECT_FILES = 50
 
-# Model configuration
-model = "codegemma:7b"
+# Seconds one project may wait for the LLM once it has a slot on the server, across every model of its chain
+LATENCY_BUDGET = 120
+# Seconds a model may take before the next model of its chain is tried; the last model gets what remains of LATENCY_BUDGET
+MODEL_TIMEOUT = 45
+
+# Ollama server (None = OLLAMA_HOST environment variable, or http://localhost:11434)
+OLLAMA_HOST = None
+
+# How long the server keeps the model loaded after the last request ("30m", "-1" = forever, "0" = unload)
+OLLAMA_KEEP_ALIVE = "30m"
+
+# Load the model while the projects are being analyzed so the first generation doesn't pay for it
+WARM_UP_MODEL = True
+
+# Maximum number of Dockerfiles generated at the same time
+# Keep it equal to the parallel slots of the Ollama server (OLLAMA_NUM_PARALLEL)
+OLLAMA_CONCURRENCY = 4
+
+# Run with --no-cache to regenerate every Dockerfile instead of reusing cached LLM responses
+BYPASS_RESPONSE_CACHE = "--no-cache" in sys.argv
+
+# Render well-understood project shapes from templates, the LLM only handles the rest
+USE_TEMPLATES = True
+
+# Ask for the Dockerfile as JSON fields (Ollama structured output) and assemble it ourselves,
+# the plain text generation is only a fallback when the fields are unusable
+STRUCTURED_OUTPUT = True
 
-# Create the simplified prompt
-prompt = f"""You are a senior DevOps engineer. Create a Dockerfile based on the project description.
+# Token budget of one generation (num_predict), a Dockerfile rarely needs more
+MAX_DOCKERFILE_TOKENS = 512
+
+# A streamed Dockerfile is written next to its output file with this suffix,
+# and only replaces the Dockerfile once the generation made a valid one
+PARTIAL_DOCKERFILE_SUFFIX = ".partial"
+
+# Dockerfile instructions; once the Dockerfile started, any other line ends it
+DOCKERFILE_INSTRUCTIONS = {
+    'FROM', 'RUN', 'CMD', 'LABEL', 'MAINTAINER', 'EXPOSE', 'ENV', 'ADD', 'COPY', 'ENTRYPOINT',
+    'VOLUME', 'USER', 'WORKDIR', 'ARG', 'ONBUILD', 'STOPSIGNAL', 'HEALTHCHECK', 'SHELL'
+}
+
+# Static part of the prompt, sent as the system prompt: it is identical for every project,
+# so the server evaluates it once and reuses its KV cache for the following generations
+SYSTEM_PROMPT = """You are a senior DevOps engineer. Create a Dockerfile based on the project description.
 
 RULES:
 1. Use WORKDIR /app
@@ -41,51 +85,304 @@ RULES:
    - gcc:14 for C++
    - php:8.3 for PHP
    - ruby:3.3 for Ruby
-   - dotnet:8.0 for C#/.NET
+   - dotnet:8.0 for C#/.NET"""
 
-PROJECT DESCRIPTION:
-{first_project['description']}
+def build_prompt(project_info, structured=False):
+    """Build the per-project part of the prompt, appended after SYSTEM_PROMPT"""
+    if structured:
+        return f"""PROJECT DESCRIPTION:
+{project_info['description']}
 
-Generate only the Dockerfile content, no explanations."""
+Answer with the Dockerfile as JSON: base_image, dependency_commands (RUN commands installing dependencies),
+build_commands (RUN commands compiling the project), cmd (the CMD as a list of strings), expose (ports, if any).
+WORKDIR /app and COPY . . are added automatically."""
 
-# Save Dockerfile inside the specific project directory
-project_dir = os.path.join("outputs", project_name)
-output_file = os.path.join(project_dir, "Dockerfile")
+    prompt = f"""PROJECT DESCRIPTION:
+{project_info['description']}
 
-# Ensure the project directory exists
-os.makedirs(project_dir, exist_ok=True)
+Generate only the Dockerfile content, no explanations."""
+    return prompt
 
-# Send the prompt and get the response
-try:
-    print(f"Generating Dockerfile for: {project_name}")
-    print(f"Saving to: {output_file}")
-    print("=" * 60)
-    
-    response = ollama.generate(
-        model=model, 
-        prompt=prompt,
-        options={
-            "temperature": 0.3,
-            "top_p": 0.9,
-            "top_k": 40
-        }
-    )
-    
-    generated_text = response.get("response", "")
-    
-    # Clean up the response
+def clean_dockerfile(generated_text):
+    """Strip the markdown code block markers around a generated Dockerfile"""
     dockerfile_content = generated_text.strip()
-    
+
     # Remove markdown code block markers
     if dockerfile_content.startswith("```dockerfile"):
         dockerfile_content = dockerfile_content[len("```dockerfile"):].strip()
     elif dockerfile_content.startswith("```"):
         dockerfile_content = dockerfile_content[3:].strip()
-    
+
     if dockerfile_content.endswith("```"):
         dockerfile_content = dockerfile_content[:-3].strip()
-    
-    print("Generated Dockerfile:")
+
+    return dockerfile_content
+
+class DockerfileStream:
+    """Collect a streamed LLM response line by line, writing the Dockerfile as it arrives
+
+    The Dockerfile starts inside a markdown fence, or at a FROM (or ARG) line
+    outside of one. It is over at its closing fence or at the first line that
+    is neither an uppercase instruction, a comment nor a continuation, which
+    is where the model starts explaining.
+    """
+
+    def __init__(self, output_file):
+        self.output = open(output_file, "w")
+        self.pending = ""
+        self.lines = []
+        self.in_fence = False
+        self.started = False
+        self.continued = False
+        self.done = False
+
+    def is_dockerfile_line(self, stripped):
+        # Case-sensitive: prose such as "From the description..." or "Run the container..." is not an instruction
+        return (self.continued or not stripped or stripped.startswith('#')
+                or stripped.split(None, 1)[0] in DOCKERFILE_INSTRUCTIONS)
+
+    def add_line(self, line):
+        line = line.rstrip()
+        stripped = line.strip()
+        if stripped.startswith("```"):
+            if self.started:
+                # Closing fence after the Dockerfile
+                self.done = True
+            else:
+                # Opening fence before it (or the end of an unrelated block)
+                self.in_fence = not self.in_fence
+            return
+        if not self.started:
+            # Skip blank lines and any preamble ("Here is the Dockerfile:")
+            if not stripped:
+                return
+            if self.in_fence:
+                if not self.is_dockerfile_line(stripped):
+                    return
+            elif stripped.split(None, 1)[0] not in ('FROM', 'ARG'):
+                return
+            self.started = True
+        elif not self.is_dockerfile_line(stripped):
+            self.done = True
+            return
+        self.continued = stripped.endswith("\\")
+        self.lines.append(line)
+        self.output.write(line + "\n")
+        self.output.flush()
+
+    def feed(self, text):
+        """Add a chunk of the response, returns True once the Dockerfile is complete"""
+        self.pending += text
+        while "\n" in self.pending and not self.done:
+            line, self.pending = self.pending.split("\n", 1)
+            self.add_line(line)
+        return self.done
+
+    def is_cut_off(self):
+        """Whether the response so far ends in the middle of an instruction"""
+        pending = self.pending.strip()
+        return not self.done and (self.continued or bool(pending and not pending.startswith("```")))
+
+    def finish(self):
+        """Close the output file and return the Dockerfile content"""
+        if not self.done and self.pending:
+            self.add_line(self.pending)
+        self.output.close()
+        return "\n".join(self.lines).strip()
+
+def parse_generation(request, generated_text):
+    """Turn a raw LLM response into Dockerfile content, ValueError if it doesn't make a usable Dockerfile"""
+    if 'format' in request:
+        return assemble_structured_dockerfile(generated_text)
+    dockerfile_content = clean_dockerfile(generated_text)
+    if not any(line.split(None, 1)[0] == 'FROM' for line in dockerfile_content.splitlines() if line.strip()):
+        raise ValueError("the response has no FROM instruction")
+    return dockerfile_content
+
+async def call_llm(llm, request, project_name, output_file, budget):
+    """Run one generation on the Ollama server once a slot is free, returns the raw response text
+
+    The project's LATENCY_BUDGET starts when it first gets a slot, so time spent
+    queued behind other projects doesn't count; budget['deadline'] caps every call after that.
+    budget['model_deadline'] is set the same way from budget['model_timeout'], for the current model.
+    """
+    loop = asyncio.get_running_loop()
+    # Wait for a free slot on the Ollama server
+    async with llm['semaphore']:
+        if budget['deadline'] is None:
+            budget['deadline'] = loop.time() + LATENCY_BUDGET
+        if budget['model_deadline'] is None:
+            budget['model_deadline'] = min(loop.time() + budget['model_timeout'], budget['deadline'])
+        timeout = budget['model_deadline'] - loop.time()
+        if timeout <= 0:
+            raise asyncio.TimeoutError()
+        return await asyncio.wait_for(request_llm(llm, request, project_name, output_file), timeout)
+
+async def request_llm(llm, request, project_name, output_file):
+    """Send one generation request, streaming plain text replies into the partial Dockerfile"""
+    print(f"Generating Dockerfile for: {project_name}")
+    print("=" * 60)
+
+    # Structured output: the schema constrains the reply, which ends with its JSON object
+    if 'format' in request:
+        response = await llm['client'].generate(keep_alive=OLLAMA_KEEP_ALIVE, **request)
+        return response.get("response", "")
+
+    # Stream the response and stop the generation as soon as the Dockerfile is complete
+    dockerfile_stream = DockerfileStream(output_file + PARTIAL_DOCKERFILE_SUFFIX)
+    stream = await llm['client'].generate(stream=True, keep_alive=OLLAMA_KEEP_ALIVE, **request)
+    done_reason = None
+    try:
+        async for chunk in stream:
+            if dockerfile_stream.feed(chunk.get("response", "")):
+                break
+            done_reason = chunk.get("done_reason")
+        # The generation ran out of MAX_DOCKERFILE_TOKENS before the Dockerfile was complete
+        cut_off = done_reason == "length" and dockerfile_stream.is_cut_off()
+    finally:
+        # Closing the stream drops the connection, which aborts the generation
+        await stream.aclose()
+        generated_text = dockerfile_stream.finish()
+    if cut_off:
+        raise ValueError(f"the response was cut off after {MAX_DOCKERFILE_TOKENS} tokens in the middle of an instruction")
+    return generated_text
+
+def finish_partial_dockerfile(output_file, keep):
+    """Move a streamed Dockerfile over output_file, or delete it when the generation failed"""
+    partial_file = output_file + PARTIAL_DOCKERFILE_SUFFIX
+    if not os.path.exists(partial_file):
+        return
+    if keep:
+        os.replace(partial_file, output_file)
+    else:
+        os.remove(partial_file)
+
+def generation_key(llm, request, project_info):
+    """Response cache and shared generation key: the request, its description reduced to canonical_description()"""
+    canonical_prompt = build_prompt({'description': canonical_description(project_info)},
+                                    structured='format' in request)
+    return llm['response_cache'].key(**dict(request, prompt=canonical_prompt))
+
+async def run_generation(llm, request, project_info, output_file, budget):
+    """Get the Dockerfile for a request from the response cache, a shared generation or the LLM
+
+    Only the project that owns a generation takes a slot on the server, the
+    ones sharing it or reading the cache don't.
+    """
+    # Same model, options and canonical description as an earlier generation: reuse its response
+    project_name = project_info['project_name']
+    response_cache = llm['response_cache']
+    cache_key = generation_key(llm, request, project_info)
+    generated_text = response_cache.get(cache_key)
+    if generated_text is not None:
+        try:
+            dockerfile_content = parse_generation(request, generated_text)
+            print(f"Reusing the cached LLM response for: {project_name}")
+            return dockerfile_content
+        except ValueError:
+            # Cached before responses were validated, generate it again
+            pass
+
+    # Projects with the same language, dependencies, executable and interactivity share one generation,
+    # including the ones that ask for it while it is still running
+    generation = llm['generations'].get(cache_key)
+    if generation is not None:
+        print(f"{project_name} has the same shape as another project, sharing its generation")
+        try:
+            generated_text = await asyncio.shield(generation)
+        except asyncio.CancelledError:
+            if not generation.cancelled():
+                raise
+            # The project that started it ran out of time
+            raise asyncio.TimeoutError()
+        return parse_generation(request, generated_text)
+
+    generation = asyncio.ensure_future(call_llm(llm, request, project_name, output_file, budget))
+    llm['generations'][cache_key] = generation
+    try:
+        generated_text = await asyncio.shield(generation)
+        dockerfile_content = parse_generation(request, generated_text)
+    except BaseException:
+        # Let the next project with this description try again,
+        # and don't leave the server generating for a project that gave up
+        del llm['generations'][cache_key]
+        generation.cancel()
+        # A timeout, a missing model or an unusable response must not leave a truncated Dockerfile
+        finish_partial_dockerfile(output_file, keep=False)
+        raise
+    finish_partial_dockerfile(output_file, keep=True)
+    # Only responses that made a valid Dockerfile are cached
+    response_cache.put(cache_key, generated_text)
+    return dockerfile_content
+
+async def generate_with_model(llm, project_info, output_file, model, budget):
+    """Ask one model for the Dockerfile of a project, structured output first, plain text as a fallback"""
+    project_name = project_info['project_name']
+    request = {
+        "model": model,
+        "system": SYSTEM_PROMPT,
+        "prompt": build_prompt(project_info),
+        "options": {
+            "temperature": 0.3,
+            "top_p": 0.9,
+            "top_k": 40,
+            "num_predict": MAX_DOCKERFILE_TOKENS
+        }
+    }
+
+    if STRUCTURED_OUTPUT:
+        structured_request = dict(request, prompt=build_prompt(project_info, structured=True),
+                                  format=DOCKERFILE_SCHEMA)
+        try:
+            return await run_generation(llm, structured_request, project_info, output_file, budget)
+        except ValueError as e:
+            print(f"Invalid structured output for {project_name} ({str(e)}), falling back to plain text")
+
+    return await run_generation(llm, request, project_info, output_file, budget)
+
+def generation_config():
+    """Hash of the settings that shape a generated Dockerfile, stored with each run"""
+    config = {
+        'model_chains': MODEL_CHAINS,
+        'system_prompt': SYSTEM_PROMPT,
+        'templates': [TEMPLATE_VERSION, DOCKERFILE_BASE_IMAGES] if USE_TEMPLATES else None,
+        'structured_output': STRUCTURED_OUTPUT,
+        'max_tokens': MAX_DOCKERFILE_TOKENS
+    }
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()
+
+async def generate_dockerfile(llm, project_info):
+    """Generate, save and record the Dockerfile of one project, returns its content"""
+    # Extract project name from the description
+    # The description format is: "The project 'project-name':"
+    description = project_info['description']
+    project_name = description.split("'")[1]  # Extract name between single quotes
+
+    # Save Dockerfile inside the specific project directory
+    project_dir = os.path.join("outputs", project_name)
+    output_file = os.path.join(project_dir, "Dockerfile")
+
+    # Ensure the project directory exists
+    os.makedirs(project_dir, exist_ok=True)
+
+    # Unchanged project: restore the Dockerfile of the last recorded run instead of regenerating it,
+    # unless it was generated with other models, prompt or templates
+    previous_run = project_info.get('previous_run') or {}
+    if previous_run.get('dockerfile') and previous_run.get('generation_config') == generation_config():
+        with open(output_file, "w") as f:
+            f.write(previous_run['dockerfile'])
+        print(f"{project_name} is unchanged since the last run, reusing the stored Dockerfile")
+        print(f"Dockerfile has been saved to '{output_file}'")
+        return previous_run['dockerfile']
+
+    # Python, Node, C/C++ with a Makefile, Go, Rust and plain Java projects need no LLM
+    dockerfile_content = render_dockerfile_template(project_info) if USE_TEMPLATES else None
+    if dockerfile_content is not None:
+        print(f"Rendered the Dockerfile template for: {project_name}")
+    else:
+        dockerfile_content = await generate_with_llm(llm, project_info, output_file)
+
+    print(f"Generated Dockerfile for {project_name}:")
     print("=" * 30)
     print(dockerfile_content)
     print("=" * 30)
@@ -95,6 +392,114 @@ try:
         f.write(dockerfile_content)
 
     print(f"\nDockerfile has been saved to '{output_file}'")
-    
-except Exception as e:
-    print(f"An error occurred: {str(e)}")
\ No newline at end of file
+
+    # Remember the result so an unchanged project skips generation next time
+    record_project_run(project_info, dockerfile=dockerfile_content, generation_config=generation_config())
+    return dockerfile_content
+
+def route_models(project_info):
+    """Model chain of a project: the fast model first for simple shapes, the large one otherwise"""
+    complex_project = (project_info['type'] == 'unknown'
+                       or len(project_info.get('languages', [])) > 1
+                       or project_info.get('file_count', 0) > COMPLEX_PROJECT_FILES)
+    return MODEL_CHAINS['complex' if complex_project else 'simple']
+
+async def generate_with_llm(llm, project_info, output_file):
+    """Generate the Dockerfile of a project along its model chain, within LATENCY_BUDGET"""
+    project_name = project_info['project_name']
+    loop = asyncio.get_running_loop()
+    # The deadline is set by call_llm, when the project first gets a slot on the server
+    budget = {'deadline': None}
+    models = [model for model in route_models(project_info) if model not in llm['missing_models']]
+    for i, model in enumerate(models):
+        if model in llm['missing_models']:
+            continue
+        if budget['deadline'] is not None and loop.time() >= budget['deadline']:
+            break
+        # Every model but the last one of the chain is cut off after MODEL_TIMEOUT
+        budget['model_timeout'] = MODEL_TIMEOUT if i < len(models) - 1 else LATENCY_BUDGET
+        budget['model_deadline'] = None
+        try:
+            return await generate_with_model(llm, project_info, output_file, model, budget)
+        except asyncio.TimeoutError:
+            print(f"{model} did not answer in time for {project_name}, trying the next model")
+        except ollama.ResponseError as e:
+            if e.status_code != 404:
+                raise
+            llm['missing_models'].add(model)
+            print(f"{model} is not available on the Ollama server, trying the next model")
+        except ValueError as e:
+            print(f"{model} did not generate a usable Dockerfile for {project_name} ({str(e)}), trying the next model")
+    raise TimeoutError(f"no model generated a usable Dockerfile for {project_name} within {LATENCY_BUDGET}s")
+
+async def warm_up_model(client, model):
+    """Load a model on the Ollama server, keep it resident for OLLAMA_KEEP_ALIVE and prime SYSTEM_PROMPT"""
+    try:
+        # A single predicted token is enough to get the system prompt evaluated and cached
+        await client.generate(model=model, system=SYSTEM_PROMPT, prompt="PROJECT DESCRIPTION:",
+                              options={"num_predict": 1}, keep_alive=OLLAMA_KEEP_ALIVE)
+        print(f"Model {model} is loaded")
+    except Exception as e:
+        print(f"Could not warm up {model}: {str(e)}")
+
+async def generate_all(analyses, client=None, concurrency=OLLAMA_CONCURRENCY):
+    """Generate the Dockerfiles of every analysis, returns (results, errors) keyed by project"""
+    # One client for the whole batch, its connections are pooled and reused
+    if client is None:
+        client = ollama.AsyncClient(host=OLLAMA_HOST)
+    if WARM_UP_MODEL:
+        # The first model of each chain serves most generations
+        first_models = dict.fromkeys(chain[0] for chain in MODEL_CHAINS.values())
+        warm_up = asyncio.gather(*(warm_up_model(client, model) for model in first_models))
+
+    # State shared by every generation of the batch
+    llm = {
+        'client': client,
+        'semaphore': asyncio.Semaphore(concurrency),
+        'response_cache': ResponseCache(bypass=BYPASS_RESPONSE_CACHE),
+        'generations': {},  # canonical request key -> running or finished generation
+        'missing_models': set()  # models the server doesn't have, skipped by the routing
+    }
+    loop = asyncio.get_running_loop()
+    tasks = {}
+    errors = {}
+
+    # Start each generation as soon as its analysis is ready,
+    # the next projects keep being analyzed in the meantime
+    while True:
+        project_info = await loop.run_in_executor(None, next, analyses, None)
+        if project_info is None:
+            break
+        if 'error' in project_info:
+            # The analysis failed, report the project with the failed generations
+            errors[project_info['project_name']] = project_info['error']
+            continue
+        tasks[project_info['project_name']] = asyncio.ensure_future(
+            generate_dockerfile(llm, project_info))
+
+    results = {}
+    outcomes = await asyncio.gather(*tasks.values(), return_exceptions=True)
+    llm['response_cache'].close()
+    if WARM_UP_MODEL:
+        await warm_up
+    for project_name, outcome in zip(tasks, outcomes):
+        if isinstance(outcome, Exception):
+            print(f"An error occurred for {project_name}: {str(outcome)}")
+            errors[project_name] = str(outcome)
+        else:
+            results[project_name] = outcome
+    return results, errors
+
+if __name__ == "__main__":
+    results, errors = asyncio.run(generate_all(iter_analyses()))
+
+    # Check if any projects were found
+    if not results and not errors:
+        print("No projects found in the directory.")
+        print("Please make sure there are project directories to analyze.")
+        exit(1)
+
+    print("=" * 60)
+    print(f"Dockerfiles generated: {len(results)}, failed: {len(errors)}")
+    for project_name, error in errors.items():
+        print(f"  {project_name}: {error}")
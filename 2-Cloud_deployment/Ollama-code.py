@@ -1,23 +1,198 @@
 import ollama
 import os
-from main import main
+import re
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from main import iter_analyses, record_project_run, render_dockerfile_template, ResponseCache
+from main import assemble_structured_dockerfile, canonical_description, DOCKERFILE_SCHEMA
+from main import DOCKERFILE_BASE_IMAGES, TEMPLATE_VERSION
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import subprocess
-import base64
 import subprocess
-import base64
 import sys
+from concurrent.futures import ThreadPoolExecutor
+
+# Model configuration
+MODEL = "codegemma:7b" # Change the model if you want to use another one
+
+# Small, fast model for simple well-classified projects; unknown, mixed-language or large ones use MODEL
+FAST_MODEL = "qwen2.5-coder:1.5b"
+
+# Models tried in order for each kind of project, the next one is used when a model is missing or too slow
+MODEL_CHAINS = {
+    'simple': [FAST_MODEL, MODEL],
+    'complex': [MODEL]
+}
+
+# Projects with more source files than this are considered complex
+COMPLEX_PROJECT_FILES = 50
+
+# Seconds one project may wait for the LLM once it has a slot on the server, across every model of its chain
+LATENCY_BUDGET = 120
+# Seconds a model may take before the next model of its chain is tried; the last model gets what remains of LATENCY_BUDGET
+MODEL_TIMEOUT = 45
+
+# Ollama server (None = OLLAMA_HOST environment variable, or http://localhost:11434)
+OLLAMA_HOST = None
+
+# How long the server keeps the model loaded after the last request ("30m", "-1" = forever, "0" = unload)
+OLLAMA_KEEP_ALIVE = "30m"
+
+# Load the model while the projects are being analyzed so the first generation doesn't pay for it
+WARM_UP_MODEL = True
+
+# Maximum number of Dockerfiles generated at the same time
+# Keep it equal to the parallel slots of the Ollama server (OLLAMA_NUM_PARALLEL)
+OLLAMA_CONCURRENCY = 4
+
+# Score Dockerfiles with the local rules, Vertex AI is only asked about the ones they can't score
+LOCAL_DOCKERFILE_ANALYSIS = True
+LOCAL_ANALYSIS_TITLE = "Dockerfile Analysis with local rules"
+VERTEX_ANALYSIS_TITLE = "Dockerfile Analysis with Vertex AI Gemini 2.0 Flash"
+
+# Vertex AI model analyzing Dockerfiles, and the version of its prompt
+# Bump ANALYSIS_PROMPT_VERSION when the prompt changes so cached analyses stop matching
+VERTEX_MODEL = "gemini-2.0-flash-001"
+ANALYSIS_PROMPT_VERSION = "1"
+
+# Sections of the local analysis report
+ANALYSIS_CATEGORIES = [
+    ('security', "Security vulnerabilities"),
+    ('best_practices', "Best practices violations"),
+    ('image_size', "Image size optimizations")
+]
+
+# Commands the local rules recognize as dependency installs and as compilations
+DEPENDENCY_INSTALL_RE = re.compile(r'\b(pip3? install|npm (install|ci)|yarn|go mod download|cargo (build|fetch)|mvn|gradle|bundle install|composer install)\b')
+BUILD_COMMAND_RE = re.compile(r'\b(make|gcc|g\+\+|go build|cargo build|javac|mvn|gradle)\b')
+
+# Toolchain images that should only be the build stage of a multi-stage Dockerfile
+BUILDER_IMAGES = ('gcc', 'golang', 'rust', 'openjdk', 'maven', 'gradle')
+
+# ENV / ARG names that usually hold credentials
+SECRET_NAME_RE = re.compile(r'(PASSWORD|PASSWD|SECRET|TOKEN|API_KEY|PRIVATE_KEY)', re.IGNORECASE)
+
+# Seconds each stage of the post-generation pipeline may take before it is given up
+STAGE_TIMEOUTS = {
+    'analysis': 120,
+    'registry': 60,
+    'image': 1800,
+    'pull_request': 300
+}
+
+# Threads running the pipeline stages, apart from the default executor that feeds the project analyses;
+# Docker builds (the 'image' stage) have their own pool so long builds don't hold up the other stages
+BUILD_WORKERS = 2
+STAGE_WORKERS = 8
+BUILD_EXECUTOR = ThreadPoolExecutor(max_workers=BUILD_WORKERS, thread_name_prefix="build")
+STAGE_EXECUTOR = ThreadPoolExecutor(max_workers=STAGE_WORKERS, thread_name_prefix="stage")
+
+# Analysis reports, kept out of the project directories so they never end up in an image build context
+ANALYSIS_DIR = os.path.join("outputs", ".analysis")
+ANALYSIS_FILE_NAME = "Dockerfile_Analysis.txt"
+
+# Artifact Registry repositories created (or being created) by this process
+ARTIFACT_REPOSITORIES = {}
+
+# Run with --no-cache to regenerate every Dockerfile instead of reusing cached LLM responses
+BYPASS_RESPONSE_CACHE = "--no-cache" in sys.argv
+
+# Render well-understood project shapes from templates, the LLM only handles the rest
+USE_TEMPLATES = True
+
+# Ask for the Dockerfile as JSON fields (Ollama structured output) and assemble it ourselves,
+# the plain text generation is only a fallback when the fields are unusable
+STRUCTURED_OUTPUT = True
+
+# Token budget of one generation (num_predict), a Dockerfile rarely needs more
+MAX_DOCKERFILE_TOKENS = 512
+
+# A streamed Dockerfile is written next to its output file with this suffix,
+# and only replaces the Dockerfile once the generation made a valid one
+PARTIAL_DOCKERFILE_SUFFIX = ".partial"
+
+# Dockerfile instructions; once the Dockerfile started, any other line ends it
+DOCKERFILE_INSTRUCTIONS = {
+    'FROM', 'RUN', 'CMD', 'LABEL', 'MAINTAINER', 'EXPOSE', 'ENV', 'ADD', 'COPY', 'ENTRYPOINT',
+    'VOLUME', 'USER', 'WORKDIR', 'ARG', 'ONBUILD', 'STOPSIGNAL', 'HEALTHCHECK', 'SHELL'
+}
+
+# API endpoints, overridable through the environment (e.g. to point them at a local stub)
+VERTEX_BASE_URL = os.environ.get("VERTEX_BASE_URL", "https://us-central1-aiplatform.googleapis.com")
+GITHUB_API_URL = os.environ.get("GITHUB_API_URL", "https://api.github.com")
+
+# Repository the generated files are pushed back to as pull requests
+GITHUB_TOKEN = "xxxxxxxxxxxxxxxxxxxx" # Get the credentials from github
+GITHUB_REPO = "xxxxxxxxxxxxx" # Change it to the project you want to push back to github
+GITHUB_USERNAME = "xxxxxxxxxxxxxx" # Your github username
+GITHUB_BASE_BRANCH = "main"
+
+# Open a single pull request for the whole batch (each project in its own directory)
+# instead of one pull request per project
+BUNDLE_PULL_REQUESTS = False
+
+# HTTP calls: timeout in seconds, retries on connection errors and 429/5xx with exponential backoff
+HTTP_TIMEOUT = 60
+HTTP_RETRIES = 3
+HTTP_BACKOFF = 0.5
+HTTP_RETRY_STATUSES = [429, 500, 502, 503, 504]
+
+# Keep-alive sessions of each thread, see get_http_session
+HTTP_SESSIONS = threading.local()
+
+# Access tokens printed by gcloud live one hour; they are refreshed a few minutes before that
+ACCESS_TOKEN_COMMAND = ['gcloud', 'auth', 'print-access-token']
+ACCESS_TOKEN_LIFETIME = 3600
+ACCESS_TOKEN_REFRESH_MARGIN = 300
+ACCESS_TOKEN = {'token': None, 'expires_at': 0}
+ACCESS_TOKEN_LOCK = threading.Lock()
+
+def get_http_session(retry_posts=False):
+    """Pooled keep-alive session of the current thread, retrying failed requests with backoff
+
+    Only idempotent methods are retried (urllib3's default), POST too with retry_posts=True:
+    a retried GitHub POST could create a second commit, ref or pull request, a Vertex AI one can't.
+    """
+    name = 'post_session' if retry_posts else 'session'
+    session = getattr(HTTP_SESSIONS, name, None)
+    if session is None:
+        allowed_methods = Retry.DEFAULT_ALLOWED_METHODS | {'POST'} if retry_posts else Retry.DEFAULT_ALLOWED_METHODS
+        retry = Retry(total=HTTP_RETRIES, backoff_factor=HTTP_BACKOFF, status_forcelist=HTTP_RETRY_STATUSES,
+                      allowed_methods=allowed_methods, raise_on_status=False)
+        adapter = HTTPAdapter(max_retries=retry)
+        session = requests.Session()
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        setattr(HTTP_SESSIONS, name, session)
+    return session
 
 def get_fresh_token():
-    result = subprocess.run(['gcloud', 'auth', 'print-access-token'], 
-                          capture_output=True, text=True)
-    return result.stdout.strip()
+    """Google access token, cached until ACCESS_TOKEN_REFRESH_MARGIN seconds before it expires"""
+    with ACCESS_TOKEN_LOCK:
+        if ACCESS_TOKEN['token'] is None or time.time() >= ACCESS_TOKEN['expires_at'] - ACCESS_TOKEN_REFRESH_MARGIN:
+            result = subprocess.run(ACCESS_TOKEN_COMMAND, capture_output=True, text=True, timeout=HTTP_TIMEOUT)
+            token = result.stdout.strip()
+            if result.returncode != 0 or not token:
+                raise RuntimeError(f"could not get an access token: {result.stderr.strip()}")
+            ACCESS_TOKEN['token'] = token
+            ACCESS_TOKEN['expires_at'] = time.time() + ACCESS_TOKEN_LIFETIME
+        return ACCESS_TOKEN['token']
+
+def invalidate_token():
+    """Forget the cached access token, the next get_fresh_token() asks gcloud again"""
+    with ACCESS_TOKEN_LOCK:
+        ACCESS_TOKEN['token'] = None
 
 def analyse_dockerfile_with_vertexai(output_file, dockerfile_content):
     try:
         access_token = get_fresh_token()
         
-        endpoint = "https://us-central1-aiplatform.googleapis.com/v1/projects/your-gcp-project/locations/us-central1/publishers/google/models/gemini-2.0-flash-001:generateContent"
+        endpoint = f"{VERTEX_BASE_URL}/v1/projects/your-gcp-project/locations/us-central1/publishers/google/models/{VERTEX_MODEL}:generateContent"
         headers = {
             "Authorization": f"Bearer {access_token}",
             "Content-Type": "application/json"
@@ -50,7 +225,14 @@ def analyse_dockerfile_with_vertexai(output_file, dockerfile_content):
             }
         }
         
-        response = requests.post(endpoint, headers=headers, json=payload)
+        # generateContent only reads, retrying it is safe
+        session = get_http_session(retry_posts=True)
+        response = session.post(endpoint, headers=headers, json=payload, timeout=HTTP_TIMEOUT)
+        if response.status_code == 401:
+            # The cached token was revoked or expired early, get a new one once
+            invalidate_token()
+            headers["Authorization"] = f"Bearer {get_fresh_token()}"
+            response = session.post(endpoint, headers=headers, json=payload, timeout=HTTP_TIMEOUT)
         response.raise_for_status()  # Raises exception for bad status codes
         
         analysis_result = response.json()['candidates'][0]['content']['parts'][0]['text']
@@ -61,18 +243,219 @@ def analyse_dockerfile_with_vertexai(output_file, dockerfile_content):
         print("=" * 50)
         
         # Save analysis to a file
-        analysis_file = os.path.join(os.path.dirname(output_file), "Dockerfile_Analysis.txt")
-        with open(analysis_file, "w") as f:
-            f.write("Dockerfile Analysis with Vertex AI Gemini 2.0 Flash\n")
-            f.write("=" * 50 + "\n\n")
-            f.write(analysis_result)
-        
-        print(f"\nDockerfile analysis has been saved to '{analysis_file}'")
+        write_analysis_file(os.path.dirname(output_file), VERTEX_ANALYSIS_TITLE, analysis_result)
+        return analysis_result
         
     except Exception as e:
         print(f"Error calling Vertex AI: {e}")
         return
 
+def parse_dockerfile(dockerfile_content):
+    """Split a Dockerfile into (line number, INSTRUCTION, arguments), joining continuation lines"""
+    instructions = []
+    current = None
+    for line_number, line in enumerate(dockerfile_content.splitlines(), 1):
+        stripped = line.strip()
+        # Blank and comment lines are skipped, also inside a continued instruction
+        if not stripped or stripped.startswith('#'):
+            continue
+        if current is None:
+            parts = stripped.split(None, 1)
+            current = [line_number, parts[0].upper(), parts[1] if len(parts) > 1 else '']
+        else:
+            current[2] += ' ' + stripped
+        if current[2].endswith('\\'):
+            current[2] = current[2][:-1].rstrip()
+        else:
+            instructions.append(tuple(current))
+            current = None
+    if current is not None:
+        instructions.append(tuple(current))
+    return instructions
+
+def split_image(image):
+    """Split an image reference into (name, tag or None, digest or None)"""
+    image, _, digest = image.partition('@')
+    name, _, tag = image.rpartition(':')
+    if not name or '/' in tag:
+        # No tag, the colon (if any) belonged to a registry port
+        return image, None, digest or None
+    return name, tag, digest or None
+
+def check_base_images(stages, instructions, project_dir):
+    findings = []
+    aliases = {alias.lower() for _, _, alias in stages if alias}
+    for line_number, image, _ in stages:
+        # scratch and earlier build stages have no tag to pin
+        if image == 'scratch' or image.lower() in aliases:
+            continue
+        name, tag, digest = split_image(image)
+        if digest:
+            continue
+        if tag is None or tag == 'latest':
+            findings.append(('security', 8, line_number,
+                             f"Base image '{image}' is not pinned: 'latest' changes under you and builds stop being reproducible. Pin a version tag (or a digest)."))
+    return findings
+
+def check_user(stages, instructions, project_dir):
+    users = [(n, args.strip()) for n, name, args in instructions if name == 'USER']
+    if not users or users[-1][1].split(':')[0] in ('root', '0'):
+        return [('security', 10, users[-1][0] if users else 0,
+                 "The container runs as root. Create an unprivileged user (RUN useradd ...) and switch to it with USER before CMD.")]
+    return []
+
+def check_dockerignore(stages, instructions, project_dir):
+    copies_context = any(name in ('COPY', 'ADD') and args.split()[:1] == ['.'] for _, name, args in instructions)
+    if copies_context and not os.path.exists(os.path.join(project_dir, ".dockerignore")):
+        return [('best_practices', 5, 0,
+                 "No .dockerignore next to the Dockerfile: COPY . . sends .git, local builds and secrets into the build context and the image.")]
+    return []
+
+def check_copy_before_install(stages, instructions, project_dir):
+    findings = []
+    context_copied_at = None
+    for line_number, name, args in instructions:
+        if name == 'FROM':
+            context_copied_at = None
+        elif name in ('COPY', 'ADD') and args.split()[:1] == ['.']:
+            context_copied_at = line_number
+        elif name == 'RUN' and context_copied_at is not None and DEPENDENCY_INSTALL_RE.search(args):
+            findings.append(('best_practices', 5, line_number,
+                             f"Dependencies are installed after COPY . . (line {context_copied_at}), so any source change reinstalls them. Copy the dependency manifest first, install, then copy the sources."))
+    return findings
+
+def check_multi_stage(stages, instructions, project_dir):
+    if len(stages) > 1:
+        return []
+    image = stages[0][1] if stages else ''
+    compiles = any(name == 'RUN' and BUILD_COMMAND_RE.search(args) for _, name, args in instructions)
+    if compiles and any(image.startswith(prefix) for prefix in BUILDER_IMAGES):
+        return [('image_size', 8, stages[0][0],
+                 f"The toolchain image '{image}' ships with the final image. Use a multi-stage build: compile in this stage, then copy the binary into a slim runtime image.")]
+    return []
+
+def check_package_caches(stages, instructions, project_dir):
+    findings = []
+    for line_number, name, args in instructions:
+        if name != 'RUN':
+            continue
+        if 'apt-get install' in args:
+            if '--no-install-recommends' not in args:
+                findings.append(('image_size', 3, line_number,
+                                 "apt-get install without --no-install-recommends pulls in packages you don't need."))
+            if '/var/lib/apt/lists' not in args:
+                findings.append(('image_size', 3, line_number,
+                                 "The apt package lists stay in the layer. Finish the same RUN with rm -rf /var/lib/apt/lists/*."))
+        if re.search(r'\bpip3? install\b', args) and '--no-cache-dir' not in args:
+            findings.append(('image_size', 2, line_number,
+                             "pip keeps its download cache in the layer. Add --no-cache-dir."))
+    return findings
+
+def check_instructions(stages, instructions, project_dir):
+    findings = []
+    for line_number, name, args in instructions:
+        if name == 'ADD' and not re.match(r'\S*(https?://|\.tar)', args):
+            findings.append(('best_practices', 2, line_number,
+                             "ADD is used for local files. Use COPY, ADD also unpacks archives and fetches URLs."))
+        elif name in ('CMD', 'ENTRYPOINT') and not args.lstrip().startswith('['):
+            findings.append(('best_practices', 3, line_number,
+                             f"{name} uses the shell form: the process doesn't get signals (docker stop waits then kills it). Use the exec form {name} [\"...\"]."))
+        elif name in ('ENV', 'ARG') and SECRET_NAME_RE.search(args):
+            findings.append(('security', 10, line_number,
+                             f"{name} looks like it carries a secret, which stays readable in the image history. Pass it at runtime or with a build secret mount."))
+    return findings
+
+# Dockerfile rules run by the local analyzer, each returns (category, penalty, line, message) findings
+DOCKERFILE_RULES = [
+    check_base_images,
+    check_user,
+    check_dockerignore,
+    check_copy_before_install,
+    check_multi_stage,
+    check_package_caches,
+    check_instructions
+]
+
+def analyse_dockerfile_locally(project_dir, dockerfile_content):
+    """Score a Dockerfile with DOCKERFILE_RULES, returns the report or None if the rules can't score it"""
+    instructions = parse_dockerfile(dockerfile_content)
+    if not instructions or instructions[0][1] not in ('FROM', 'ARG'):
+        return None
+    if any(name not in DOCKERFILE_INSTRUCTIONS for _, name, _ in instructions):
+        return None
+
+    # (line, image, alias) of every build stage; variable images can't be checked
+    stages = []
+    for line_number, name, args in instructions:
+        if name == 'FROM':
+            parts = [p for p in args.split() if not p.startswith('--')]
+            if not parts or '$' in parts[0]:
+                return None
+            stages.append((line_number, parts[0], parts[2] if len(parts) > 2 else None))
+    if not stages:
+        return None
+
+    findings = []
+    for rule in DOCKERFILE_RULES:
+        findings.extend(rule(stages, instructions, project_dir))
+
+    score = max(0, 100 - sum(penalty for _, penalty, _, _ in findings))
+    report = [f"Score: {score}/100 ({len(findings)} issue(s) found by the local rules)", ""]
+    for category, title in ANALYSIS_CATEGORIES:
+        report.append(title)
+        messages = [f"- {'line ' + str(line) + ': ' if line else ''}{message}"
+                    for found, _, line, message in findings if found == category]
+        report.extend(messages or ["- Nothing to report."])
+        report.append("")
+    return "\n".join(report).rstrip()
+
+def analyse_dockerfile(project_dir, output_file, dockerfile_content):
+    """Analyze a Dockerfile with the local rules, Vertex AI only when they can't score it
+
+    Returns (analysis text or None, title of the analysis file).
+    """
+    if LOCAL_DOCKERFILE_ANALYSIS:
+        analysis_result = analyse_dockerfile_locally(project_dir, dockerfile_content)
+        if analysis_result is not None:
+            write_analysis_file(project_dir, LOCAL_ANALYSIS_TITLE, analysis_result)
+            return analysis_result, LOCAL_ANALYSIS_TITLE
+        print("The local rules can't score this Dockerfile, asking Vertex AI")
+
+    # Identical Dockerfiles (up to whitespace) reuse the analysis Vertex AI already made
+    analysis_cache = ResponseCache(bypass=BYPASS_RESPONSE_CACHE)
+    try:
+        cache_key = analysis_cache.key(VERTEX_MODEL, dockerfile_content, prompt_version=ANALYSIS_PROMPT_VERSION)
+        analysis_result = analysis_cache.get(cache_key)
+        if analysis_result is not None:
+            print("This Dockerfile was already analyzed by Vertex AI, reusing the analysis")
+            write_analysis_file(project_dir, VERTEX_ANALYSIS_TITLE, analysis_result)
+            return analysis_result, VERTEX_ANALYSIS_TITLE
+
+        analysis_result = analyse_dockerfile_with_vertexai(output_file, dockerfile_content)
+        if analysis_result:
+            analysis_cache.put(cache_key, analysis_result)
+        return analysis_result, VERTEX_ANALYSIS_TITLE
+    finally:
+        analysis_cache.close()
+
+def analysis_file_path(project_dir):
+    """Dockerfile_Analysis.txt of the project in project_dir, under ANALYSIS_DIR"""
+    return os.path.join(ANALYSIS_DIR, os.path.basename(os.path.normpath(project_dir)), ANALYSIS_FILE_NAME)
+
+def write_analysis_file(project_dir, title, analysis_result):
+    """Write the Dockerfile_Analysis.txt of a project, outside of its build context"""
+    analysis_file = analysis_file_path(project_dir)
+    os.makedirs(os.path.dirname(analysis_file), exist_ok=True)
+    with open(analysis_file, "w") as f:
+        f.write(title + "\n")
+        f.write("=" * 50 + "\n\n")
+        f.write(analysis_result)
+    print(f"\nDockerfile analysis has been saved to '{analysis_file}'")
+
+def time_left(deadline):
+    """Seconds left before a time.time() deadline, the timeout of the next command of a stage"""
+    return max(deadline - time.time(), 0)
+
 def build_and_push_to_artifact_registry(project_dir, project_name):
     """
     Build and push Docker image to Google Artifact Registry
@@ -86,11 +469,15 @@ def build_and_push_to_artifact_registry(project_dir, project_name):
     # Artifact Registry URL format
     ar_image = f'{region}-docker.pkg.dev/{project_id}/{repository_name}/{docker_image_name}:latest'
 
+    # The commands share the stage budget; a command running past it is killed
+    # (subprocess.TimeoutExpired) instead of keeping its executor thread busy
+    deadline = time.time() + STAGE_TIMEOUTS['image']
+
     try:
         print("Configuring Docker authentication for Artifact Registry...")
         # Configure Docker to use gcloud as credential helper
         auth_cmd = ['sudo','gcloud', 'auth', 'configure-docker', f'{region}-docker.pkg.dev', '--quiet']
-        result = subprocess.run(auth_cmd, capture_output=True, text=True)
+        result = subprocess.run(auth_cmd, capture_output=True, text=True, timeout=time_left(deadline))
         
         if result.returncode != 0:
             print(f"Authentication configuration failed: {result.stderr}")
@@ -98,7 +485,7 @@ def build_and_push_to_artifact_registry(project_dir, project_name):
 
         print("Building the Docker image...")
         build_cmd = ['sudo', 'docker', 'build', '-t', docker_image_name, '.']
-        result = subprocess.run(build_cmd, cwd=project_dir, capture_output=True, text=True)
+        result = subprocess.run(build_cmd, cwd=project_dir, capture_output=True, text=True, timeout=time_left(deadline))
 
         if result.returncode != 0:
             print(f"Build failed: {result.stderr}")
@@ -106,7 +493,7 @@ def build_and_push_to_artifact_registry(project_dir, project_name):
         
         print("Build successful. Tagging the image for Artifact Registry...")
         tag_cmd = ['sudo', 'docker', 'tag', docker_image_name, ar_image]
-        result = subprocess.run(tag_cmd, capture_output=True, text=True)
+        result = subprocess.run(tag_cmd, capture_output=True, text=True, timeout=time_left(deadline))
         
         if result.returncode != 0:
             print(f"Tagging failed: {result.stderr}")
@@ -114,7 +501,7 @@ def build_and_push_to_artifact_registry(project_dir, project_name):
 
         print("Pushing the image to Artifact Registry...")
         push_cmd = ['sudo', 'docker', 'push', ar_image]
-        result = subprocess.run(push_cmd, capture_output=True, text=True)
+        result = subprocess.run(push_cmd, capture_output=True, text=True, timeout=time_left(deadline))
         
         if result.returncode != 0:
             print(f"Push failed: {result.stderr}")
@@ -144,7 +531,7 @@ def create_artifact_registry_repository(project_id, region, repository_name):
             '--description=Docker images for automated builds'
         ]
         
-        result = subprocess.run(create_cmd, capture_output=True, text=True)
+        result = subprocess.run(create_cmd, capture_output=True, text=True, timeout=STAGE_TIMEOUTS['registry'])
         
         if result.returncode == 0:
             print(f"Repository '{repository_name}' created successfully")
@@ -160,183 +547,171 @@ def create_artifact_registry_repository(project_id, region, repository_name):
         print(f"Error creating repository: {e}")
         return False
 
-def push_code_back_to_github(project_name, project_dir):
-    GITHUB_TOKEN = "xxxxxxxxxxxxxxxxxxxx" # Get the credentials from github
-    repo_name = "xxxxxxxxxxxxx" # Change it to the project you want to push back to github
-    GITHUB_USERNAME = "xxxxxxxxxxxxxx" # Your github username
-    branch_name = f"add-dockerfile-{project_name.lower()}"
-    base_url = f"https://api.github.com/repos/{GITHUB_USERNAME}/{repo_name}"
-    
+def read_generated_files(project_dir, prefix=""):
+    """Dockerfile and Dockerfile_Analysis.txt of a project as {repository path: content}"""
+    files = {}
+    paths = {"Dockerfile": os.path.join(project_dir, "Dockerfile"), ANALYSIS_FILE_NAME: analysis_file_path(project_dir)}
+    for name, path in paths.items():
+        if os.path.exists(path):
+            with open(path, "r") as file:
+                files[prefix + name] = file.read()
+        else:
+            print(f" {name} not found at {path}")
+    return files
+
+def github_upload(files, branch_name, commit_message, pr_title, pr_body):
+    """Commit files ({repository path: content}) in a single commit on branch_name and open the PR
+
+    Uses the Git Data API: the branch head (or the base branch for a new branch),
+    one tree with every file inline, one commit, one ref, then the pull request.
+    Commits already on an existing branch are kept, the new one goes on top of them.
+    """
+    base_url = f"{GITHUB_API_URL}/repos/{GITHUB_USERNAME}/{GITHUB_REPO}"
     headers = {
         "Authorization": f"Bearer {GITHUB_TOKEN}",
         "Accept": "application/vnd.github.v3+json",
         "Content-Type": "application/json"
     }
+    session = get_http_session()
 
     try:
-        # Step 1: Get main branch SHA
-        print("Getting main branch SHA...")
-        main_ref_response = requests.get(f"{base_url}/git/refs/heads/main", headers=headers)
-        if main_ref_response.status_code != 200:
-            print(f"Failed to get main branch: {main_ref_response.json()}")
-            return False
-        
-        main_branch_sha = main_ref_response.json()["object"]["sha"]
-        print(f"Main branch SHA: {main_branch_sha}")
-
-        # Step 2: Create new branch
-        print(f"Creating branch '{branch_name}'...")
-        create_branch_payload = {
-            "ref": f"refs/heads/{branch_name}",
-            "sha": main_branch_sha
+        # Step 1: Get the head commit and tree to build on: the branch itself when an earlier
+        # run (or a reviewer) already pushed to it, the base branch otherwise
+        print(f"Getting branch '{branch_name}'...")
+        head_response = session.get(f"{base_url}/branches/{branch_name}", headers=headers, timeout=HTTP_TIMEOUT)
+        branch_exists = head_response.status_code == 200
+        if not branch_exists:
+            print(f"Getting {GITHUB_BASE_BRANCH} branch...")
+            head_response = session.get(f"{base_url}/branches/{GITHUB_BASE_BRANCH}", headers=headers, timeout=HTTP_TIMEOUT)
+            if head_response.status_code != 200:
+                print(f"Failed to get {GITHUB_BASE_BRANCH} branch: {head_response.json()}")
+                return False
+        base_commit = head_response.json()["commit"]
+        base_commit_sha = base_commit["sha"]
+        base_tree_sha = base_commit["commit"]["tree"]["sha"]
+        print(f"{branch_name if branch_exists else GITHUB_BASE_BRANCH} branch SHA: {base_commit_sha}")
+
+        # Step 2: One tree holding every generated file, on top of the head tree
+        print(f"Uploading {len(files)} file(s)...")
+        tree_payload = {
+            "base_tree": base_tree_sha,
+            "tree": [{"path": path, "mode": "100644", "type": "blob", "content": content}
+                     for path, content in sorted(files.items())]
         }
-        
-        branch_response = requests.post(f"{base_url}/git/refs", json=create_branch_payload, headers=headers)
-        if branch_response.status_code == 201:
-            print(f"Branch '{branch_name}' created successfully.")
-        elif branch_response.status_code == 422:
-            print(f"Branch '{branch_name}' already exists.")
-        else:
-            print(f" Failed to create branch: {branch_response.json()}")
+        tree_response = session.post(f"{base_url}/git/trees", json=tree_payload, headers=headers, timeout=HTTP_TIMEOUT)
+        if tree_response.status_code != 201:
+            print(f"Failed to create tree: {tree_response.json()}")
             return False
 
-        # Step 3: Push Dockerfile
-        print("Uploading Dockerfile...")
-        dockerfile_path = os.path.join(project_dir, "Dockerfile")
-        
-        if not os.path.exists(dockerfile_path):
-            print(f" Dockerfile not found at {dockerfile_path}")
-            return False
-            
-        with open(dockerfile_path, "r") as file:
-            dockerfile_content = file.read()
-        
-        dockerfile_base64 = base64.b64encode(dockerfile_content.encode()).decode()
-        
-        dockerfile_payload = {
-            "message": f"Add auto-generated Dockerfile for {project_name}",
-            "content": dockerfile_base64,
-            "branch": branch_name
+        # Step 3: A single commit for all of them
+        commit_payload = {
+            "message": commit_message,
+            "tree": tree_response.json()["sha"],
+            "parents": [base_commit_sha]
         }
-        
-        dockerfile_response = requests.put(f"{base_url}/contents/Dockerfile", 
-                                         json=dockerfile_payload, headers=headers)
-        
-        if dockerfile_response.status_code in [200, 201]:
-            print(" Dockerfile uploaded successfully.")
-        else:
-            print(f" Failed to upload Dockerfile: {dockerfile_response.json()}")
+        commit_response = session.post(f"{base_url}/git/commits", json=commit_payload, headers=headers, timeout=HTTP_TIMEOUT)
+        if commit_response.status_code != 201:
+            print(f"Failed to create commit: {commit_response.json()}")
             return False
+        commit_sha = commit_response.json()["sha"]
 
-        # Step 4: Push Dockerfile Analysis
-        print("Uploading Dockerfile Analysis...")
-        analysis_path = os.path.join(project_dir, "Dockerfile_Analysis.txt")
-        
-        print(f"Looking for analysis file at: {analysis_path}")
-        print(f"File exists: {os.path.exists(analysis_path)}")
-        
-        if not os.path.exists(analysis_path):
-            print(f" Analysis file not found at {analysis_path}")
-            # Try alternative path - current directory
-            alt_analysis_path = os.path.join(os.getcwd(), "Dockerfile_Analysis.txt")
-            print(f"Trying alternative path: {alt_analysis_path}")
-            if os.path.exists(alt_analysis_path):
-                analysis_path = alt_analysis_path
-                print(" Found analysis file in current directory")
-            else:
-                print(" Skipping analysis file upload...")
-                analysis_path = None
-        
-        if analysis_path:
-            with open(analysis_path, "r") as file:
-                analysis_content = file.read()
-            
-            analysis_base64 = base64.b64encode(analysis_content.encode()).decode()
-            
-            # Check if analysis file already exists to get its SHA
-            existing_analysis_response = requests.get(f"{base_url}/contents/Dockerfile_Analysis.txt?ref={branch_name}", headers=headers)
-            
-            analysis_payload = {
-                "message": f"Add Dockerfile analysis for {project_name}",
-                "content": analysis_base64,
-                "branch": branch_name
-            }
-            
-            # If file exists, add its SHA to the payload
-            if existing_analysis_response.status_code == 200:
-                analysis_payload["sha"] = existing_analysis_response.json()["sha"]
-                print("Updating existing analysis file...")
-            else:
-                print("Creating new analysis file...")
-            
-            analysis_response = requests.put(f"{base_url}/contents/Dockerfile_Analysis.txt", 
-                                           json=analysis_payload, headers=headers)
-            
-            if analysis_response.status_code in [200, 201]:
-                print("Dockerfile Analysis uploaded successfully.")
-            else:
-                print(f"Failed to upload Analysis: {analysis_response.json()}")
+        # Step 4: Create the branch, or fast-forward the existing one to the new commit
+        # (no force: a commit pushed in the meantime makes the update fail instead of being lost)
+        if branch_exists:
+            print(f"Branch '{branch_name}' already exists, updating it.")
+            ref_response = session.patch(f"{base_url}/git/refs/heads/{branch_name}",
+                                         json={"sha": commit_sha}, headers=headers, timeout=HTTP_TIMEOUT)
+        else:
+            print(f"Creating branch '{branch_name}'...")
+            ref_payload = {"ref": f"refs/heads/{branch_name}", "sha": commit_sha}
+            ref_response = session.post(f"{base_url}/git/refs", json=ref_payload, headers=headers, timeout=HTTP_TIMEOUT)
+        if ref_response.status_code not in [200, 201]:
+            print(f" Failed to update branch: {ref_response.json()}")
+            return False
+        print(f"Branch '{branch_name}' points to commit {commit_sha}.")
 
         # Step 5: Create Pull Request
         print("Creating Pull Request...")
         pr_payload = {
-            "title": f" Auto-generated Dockerfile for {project_name}",
+            "title": pr_title,
             "head": branch_name,
-            "base": "main",  # Use detected default branch
-            "body": f"""##  Auto-generated Dockerfile
+            "base": GITHUB_BASE_BRANCH,
+            "body": pr_body
+        }
+        pr_response = session.post(f"{base_url}/pulls", json=pr_payload, headers=headers, timeout=HTTP_TIMEOUT)
+
+        if pr_response.status_code == 201:
+            pr_url = pr_response.json()["html_url"]
+            print(f"Pull request created successfully!")
+            print(f" PR URL: {pr_url}")
+            return True
+        elif pr_response.status_code == 422 and "already exists" in pr_response.text:
+            # The updated branch already has its pull request
+            print("A pull request already exists for this branch, it now shows the new commit.")
+            return True
+        else:
+            print(f"Failed to create pull request: {pr_response.json()}")
+            return False
+
+    except Exception as e:
+        print(f" Error in GitHub push: {e}")
+        return False
+
+def push_code_back_to_github(project_name, project_dir):
+    """Open a pull request adding the generated Dockerfile and its analysis to the repository"""
+    branch_name = f"add-dockerfile-{project_name.lower()}"
+    files = read_generated_files(project_dir)
+    if "Dockerfile" not in files:
+        return False
+
+    return github_upload(
+        files, branch_name,
+        commit_message=f"Add auto-generated Dockerfile for {project_name}",
+        pr_title=f" Auto-generated Dockerfile for {project_name}",
+        pr_body=f"""##  Auto-generated Dockerfile
 
 This PR was automatically created by the DevOps pipeline for project: **{project_name}**
 
 ### What's included:
 - Dockerfile - Generated using Ollama CodeGemma
-- Dockerfile_Analysis.txt - Security & optimization analysis by Vertex AI
+- Dockerfile_Analysis.txt - Security & optimization analysis
 - Docker Image - Built and pushed to Google Artifact Registry
 
 ### Pipeline Steps:
 1. Project detection and analysis
 2. Dockerfile generation with AI
-3. Security analysis with Vertex AI Gemini
+3. Dockerfile analysis (local rules, Vertex AI Gemini when needed)
 4. Docker build and push to Artifact Registry
 5. Automated PR creation
 
-Ready for review! """
-        }
-        
-        pr_response = requests.post(f"{base_url}/pulls", json=pr_payload, headers=headers)
-        
-        if pr_response.status_code == 201:
-            pr_url = pr_response.json()["html_url"]
-            print(f"Pull request created successfully!")
-            print(f" PR URL: {pr_url}")
-            return True
-        else:
-            print(f"Failed to create pull request: {pr_response.json()}")
-            return False
-            
-    except Exception as e:
-        print(f" Error in GitHub push: {e}")
+Ready for review! """)
+
+def push_projects_to_github(project_names):
+    """Open one pull request adding the generated files of several projects, each under its own directory"""
+    files = {}
+    for project_name in project_names:
+        files.update(read_generated_files(os.path.join("outputs", project_name), prefix=f"{project_name}/"))
+    if not files:
         return False
-# Analyze projects
-analyses = main()
 
-# Check if any projects were found
-if not analyses or len(analyses) == 0:
-    print("No projects found in the directory.")
-    print("Please make sure there are project directories to analyze.")
-    exit(1)
+    project_list = "\n".join(f"- **{project_name}**" for project_name in project_names)
+    return github_upload(
+        files, f"add-dockerfiles-{time.strftime('%Y%m%d-%H%M%S')}",
+        commit_message=f"Add auto-generated Dockerfiles for {len(project_names)} projects",
+        pr_title=f" Auto-generated Dockerfiles for {len(project_names)} projects",
+        pr_body=f"""##  Auto-generated Dockerfiles
 
-first_project = analyses[0]
+This PR was automatically created by the DevOps pipeline for the projects:
+{project_list}
 
-# Extract project name from the description
-# The description format is: "The project 'project-name':"
-description = first_project['description']
-project_name = description.split("'")[1]  # Extract name between single quotes
+Each project directory gets its Dockerfile and Dockerfile_Analysis.txt.
 
-# Model configuration
-model = "codegemma:7b" # Change the model if you want to use another one
+Ready for review! """)
 
 # The prompt(You can modify it based on your needs)
-prompt = f"""You are a senior DevOps engineer. Create a Dockerfile based on the project description.
+# Its static part is sent as the system prompt: it is identical for every project,
+# so the server evaluates it once and reuses its KV cache for the following generations
+SYSTEM_PROMPT = """You are a senior DevOps engineer. Create a Dockerfile based on the project description.
 
 RULES:
 1. Use WORKDIR /app
@@ -355,51 +730,395 @@ RULES:
    - gcc:14 for C++
    - php:8.3 for PHP
    - ruby:3.3 for Ruby
-   - dotnet:8.0 for C#/.NET
+   - dotnet:8.0 for C#/.NET"""
 
-PROJECT DESCRIPTION:
-{first_project['description']}
+def build_prompt(project_info, structured=False):
+    """Build the per-project part of the prompt, appended after SYSTEM_PROMPT"""
+    if structured:
+        return f"""PROJECT DESCRIPTION:
+{project_info['description']}
 
-Generate only the Dockerfile content, no explanations."""
+Answer with the Dockerfile as JSON: base_image, dependency_commands (RUN commands installing dependencies),
+build_commands (RUN commands compiling the project), cmd (the CMD as a list of strings), expose (ports, if any).
+WORKDIR /app and COPY . . are added automatically."""
 
-# Save Dockerfile inside the specific project directory
-project_dir = os.path.join("outputs", project_name)
-output_file = os.path.join(project_dir, "Dockerfile")
+    prompt = f"""PROJECT DESCRIPTION:
+{project_info['description']}
 
-# Ensure the project directory exists
-os.makedirs(project_dir, exist_ok=True)
+Generate only the Dockerfile content, no explanations."""
+    return prompt
 
-# Send the prompt and get the response
-try:
-    print(f"Generating Dockerfile for: {project_name}")
-    print(f"Saving to: {output_file}")
-    print("=" * 60)
-    
-    response = ollama.generate(
-        model=model, 
-        prompt=prompt,
-        options={
-            "temperature": 0.3,
-            "top_p": 0.9,
-            "top_k": 40
-        }
-    )
-    
-    generated_text = response.get("response", "")
-    
-    # Clean up the response
+def clean_dockerfile(generated_text):
+    """Strip the markdown code block markers around a generated Dockerfile"""
     dockerfile_content = generated_text.strip()
-    
+
     # Remove markdown code block markers
     if dockerfile_content.startswith("```dockerfile"):
         dockerfile_content = dockerfile_content[len("```dockerfile"):].strip()
     elif dockerfile_content.startswith("```"):
         dockerfile_content = dockerfile_content[3:].strip()
-    
+
     if dockerfile_content.endswith("```"):
         dockerfile_content = dockerfile_content[:-3].strip()
-    
-    print("Generated Dockerfile:")
+
+    return dockerfile_content
+
+async def run_stage(name, func, *args):
+    """Run a blocking pipeline stage in a thread within its STAGE_TIMEOUTS budget, None if it fails
+
+    The budget starts once a thread of BUILD_EXECUTOR (image) or STAGE_EXECUTOR
+    (the other stages) picks the stage up, not while it waits for one.
+    """
+    loop = asyncio.get_running_loop()
+    started = asyncio.Event()
+
+    def run():
+        loop.call_soon_threadsafe(started.set)
+        return func(*args)
+
+    executor = BUILD_EXECUTOR if name == 'image' else STAGE_EXECUTOR
+    stage = loop.run_in_executor(executor, run)
+    try:
+        await started.wait()
+        return await asyncio.wait_for(stage, STAGE_TIMEOUTS[name])
+    except asyncio.TimeoutError:
+        print(f"Pipeline stage '{name}' timed out after {STAGE_TIMEOUTS[name]}s")
+    except Exception as e:
+        print(f"Pipeline stage '{name}' failed: {str(e)}")
+    return None
+
+async def ensure_artifact_repository(project_id, region, repository_name):
+    """Create the Artifact Registry repository once per process, concurrent projects share the call"""
+    key = (project_id, region, repository_name)
+    if key not in ARTIFACT_REPOSITORIES:
+        ARTIFACT_REPOSITORIES[key] = asyncio.ensure_future(
+            run_stage('registry', create_artifact_registry_repository, project_id, region, repository_name))
+    creation = ARTIFACT_REPOSITORIES[key]
+    created = await creation
+    if not created and ARTIFACT_REPOSITORIES.get(key) is creation:
+        # Let the next project try again
+        del ARTIFACT_REPOSITORIES[key]
+    return created
+
+async def run_stage_graph(stages):
+    """Run {name: (dependencies, coroutine factory)}, each stage as soon as its dependencies are done
+
+    Dependencies only order the stages: a failed stage returns None and its dependents still run.
+    """
+    tasks = {}
+
+    async def run(name):
+        dependencies, start_stage = stages[name]
+        for dependency in dependencies:
+            await tasks[dependency]
+        return await start_stage()
+
+    for name in stages:
+        tasks[name] = asyncio.ensure_future(run(name))
+    results = await asyncio.gather(*tasks.values())
+    return dict(zip(tasks, results))
+
+async def deploy_project(project_info, project_name, project_dir, output_file, dockerfile_content):
+    """Analyze, build, push and open the PR for a generated Dockerfile, returns the recorded run"""
+    stages = {
+        # Analyze the generated Dockerfile, locally when the rules can score it
+        'analysis': ([], lambda: run_stage('analysis', analyse_dockerfile, project_dir, output_file, dockerfile_content)),
+        # Create repository for storing images inside artifct registry (once per process)
+        'registry': ([], lambda: ensure_artifact_repository("total-treat-466514-k4", "us-central1", "docker-images")),
+        # Build and push to GAR, concurrently with the analysis
+        'image': (['registry'], lambda: run_stage('image', build_and_push_to_artifact_registry, project_dir, project_name))
+    }
+    if not BUNDLE_PULL_REQUESTS:
+        # Push the code to Github as Pull Request, it uploads Dockerfile_Analysis.txt so it waits for the analysis
+        stages['pull_request'] = (['analysis'], lambda: run_stage('pull_request', push_code_back_to_github, project_name, project_dir))
+    results = await run_stage_graph(stages)
+    analysis_result, analysis_title = results['analysis'] or (None, None)
+    image_pushed = bool(results['image'])
+    pr_created = bool(results.get('pull_request'))
+
+    # Remember the result so an unchanged project short-circuits the whole chain next time
+    run = {
+        'dockerfile': dockerfile_content,
+        'analysis': analysis_result,
+        'analysis_title': analysis_title,
+        'image_pushed': image_pushed,
+        'pr_created': pr_created,
+        'pipeline_complete': bool(analysis_result and image_pushed and pr_created),
+        'generation_config': generation_config()
+    }
+    record_project_run(project_info, **run)
+    return run
+
+class DockerfileStream:
+    """Collect a streamed LLM response line by line, writing the Dockerfile as it arrives
+
+    The Dockerfile starts inside a markdown fence, or at a FROM (or ARG) line
+    outside of one. It is over at its closing fence or at the first line that
+    is neither an uppercase instruction, a comment nor a continuation, which
+    is where the model starts explaining.
+    """
+
+    def __init__(self, output_file):
+        self.output = open(output_file, "w")
+        self.pending = ""
+        self.lines = []
+        self.in_fence = False
+        self.started = False
+        self.continued = False
+        self.done = False
+
+    def is_dockerfile_line(self, stripped):
+        # Case-sensitive: prose such as "From the description..." or "Run the container..." is not an instruction
+        return (self.continued or not stripped or stripped.startswith('#')
+                or stripped.split(None, 1)[0] in DOCKERFILE_INSTRUCTIONS)
+
+    def add_line(self, line):
+        line = line.rstrip()
+        stripped = line.strip()
+        if stripped.startswith("```"):
+            if self.started:
+                # Closing fence after the Dockerfile
+                self.done = True
+            else:
+                # Opening fence before it (or the end of an unrelated block)
+                self.in_fence = not self.in_fence
+            return
+        if not self.started:
+            # Skip blank lines and any preamble ("Here is the Dockerfile:")
+            if not stripped:
+                return
+            if self.in_fence:
+                if not self.is_dockerfile_line(stripped):
+                    return
+            elif stripped.split(None, 1)[0] not in ('FROM', 'ARG'):
+                return
+            self.started = True
+        elif not self.is_dockerfile_line(stripped):
+            self.done = True
+            return
+        self.continued = stripped.endswith("\\")
+        self.lines.append(line)
+        self.output.write(line + "\n")
+        self.output.flush()
+
+    def feed(self, text):
+        """Add a chunk of the response, returns True once the Dockerfile is complete"""
+        self.pending += text
+        while "\n" in self.pending and not self.done:
+            line, self.pending = self.pending.split("\n", 1)
+            self.add_line(line)
+        return self.done
+
+    def is_cut_off(self):
+        """Whether the response so far ends in the middle of an instruction"""
+        pending = self.pending.strip()
+        return not self.done and (self.continued or bool(pending and not pending.startswith("```")))
+
+    def finish(self):
+        """Close the output file and return the Dockerfile content"""
+        if not self.done and self.pending:
+            self.add_line(self.pending)
+        self.output.close()
+        return "\n".join(self.lines).strip()
+
+def parse_generation(request, generated_text):
+    """Turn a raw LLM response into Dockerfile content, ValueError if it doesn't make a usable Dockerfile"""
+    if 'format' in request:
+        return assemble_structured_dockerfile(generated_text)
+    dockerfile_content = clean_dockerfile(generated_text)
+    if not any(line.split(None, 1)[0] == 'FROM' for line in dockerfile_content.splitlines() if line.strip()):
+        raise ValueError("the response has no FROM instruction")
+    return dockerfile_content
+
+async def call_llm(llm, request, project_name, output_file, budget):
+    """Run one generation on the Ollama server once a slot is free, returns the raw response text
+
+    The project's LATENCY_BUDGET starts when it first gets a slot, so time spent
+    queued behind other projects doesn't count; budget['deadline'] caps every call after that.
+    budget['model_deadline'] is set the same way from budget['model_timeout'], for the current model.
+    """
+    loop = asyncio.get_running_loop()
+    # Wait for a free slot on the Ollama server
+    async with llm['semaphore']:
+        if budget['deadline'] is None:
+            budget['deadline'] = loop.time() + LATENCY_BUDGET
+        if budget['model_deadline'] is None:
+            budget['model_deadline'] = min(loop.time() + budget['model_timeout'], budget['deadline'])
+        timeout = budget['model_deadline'] - loop.time()
+        if timeout <= 0:
+            raise asyncio.TimeoutError()
+        return await asyncio.wait_for(request_llm(llm, request, project_name, output_file), timeout)
+
+async def request_llm(llm, request, project_name, output_file):
+    """Send one generation request, streaming plain text replies into the partial Dockerfile"""
+    print(f"Generating Dockerfile for: {project_name}")
+    print("=" * 60)
+
+    # Structured output: the schema constrains the reply, which ends with its JSON object
+    if 'format' in request:
+        response = await llm['client'].generate(keep_alive=OLLAMA_KEEP_ALIVE, **request)
+        return response.get("response", "")
+
+    # Stream the response and stop the generation as soon as the Dockerfile is complete
+    dockerfile_stream = DockerfileStream(output_file + PARTIAL_DOCKERFILE_SUFFIX)
+    stream = await llm['client'].generate(stream=True, keep_alive=OLLAMA_KEEP_ALIVE, **request)
+    done_reason = None
+    try:
+        async for chunk in stream:
+            if dockerfile_stream.feed(chunk.get("response", "")):
+                break
+            done_reason = chunk.get("done_reason")
+        # The generation ran out of MAX_DOCKERFILE_TOKENS before the Dockerfile was complete
+        cut_off = done_reason == "length" and dockerfile_stream.is_cut_off()
+    finally:
+        # Closing the stream drops the connection, which aborts the generation
+        await stream.aclose()
+        generated_text = dockerfile_stream.finish()
+    if cut_off:
+        raise ValueError(f"the response was cut off after {MAX_DOCKERFILE_TOKENS} tokens in the middle of an instruction")
+    return generated_text
+
+def finish_partial_dockerfile(output_file, keep):
+    """Move a streamed Dockerfile over output_file, or delete it when the generation failed"""
+    partial_file = output_file + PARTIAL_DOCKERFILE_SUFFIX
+    if not os.path.exists(partial_file):
+        return
+    if keep:
+        os.replace(partial_file, output_file)
+    else:
+        os.remove(partial_file)
+
+def generation_key(llm, request, project_info):
+    """Response cache and shared generation key: the request, its description reduced to canonical_description()"""
+    canonical_prompt = build_prompt({'description': canonical_description(project_info)},
+                                    structured='format' in request)
+    return llm['response_cache'].key(**dict(request, prompt=canonical_prompt))
+
+async def run_generation(llm, request, project_info, output_file, budget):
+    """Get the Dockerfile for a request from the response cache, a shared generation or the LLM
+
+    Only the project that owns a generation takes a slot on the server, the
+    ones sharing it or reading the cache don't.
+    """
+    # Same model, options and canonical description as an earlier generation: reuse its response
+    project_name = project_info['project_name']
+    response_cache = llm['response_cache']
+    cache_key = generation_key(llm, request, project_info)
+    generated_text = response_cache.get(cache_key)
+    if generated_text is not None:
+        try:
+            dockerfile_content = parse_generation(request, generated_text)
+            print(f"Reusing the cached LLM response for: {project_name}")
+            return dockerfile_content
+        except ValueError:
+            # Cached before responses were validated, generate it again
+            pass
+
+    # Projects with the same language, dependencies, executable and interactivity share one generation,
+    # including the ones that ask for it while it is still running
+    generation = llm['generations'].get(cache_key)
+    if generation is not None:
+        print(f"{project_name} has the same shape as another project, sharing its generation")
+        try:
+            generated_text = await asyncio.shield(generation)
+        except asyncio.CancelledError:
+            if not generation.cancelled():
+                raise
+            # The project that started it ran out of time
+            raise asyncio.TimeoutError()
+        return parse_generation(request, generated_text)
+
+    generation = asyncio.ensure_future(call_llm(llm, request, project_name, output_file, budget))
+    llm['generations'][cache_key] = generation
+    try:
+        generated_text = await asyncio.shield(generation)
+        dockerfile_content = parse_generation(request, generated_text)
+    except BaseException:
+        # Let the next project with this description try again,
+        # and don't leave the server generating for a project that gave up
+        del llm['generations'][cache_key]
+        generation.cancel()
+        # A timeout, a missing model or an unusable response must not leave a truncated Dockerfile
+        finish_partial_dockerfile(output_file, keep=False)
+        raise
+    finish_partial_dockerfile(output_file, keep=True)
+    # Only responses that made a valid Dockerfile are cached
+    response_cache.put(cache_key, generated_text)
+    return dockerfile_content
+
+async def generate_with_model(llm, project_info, output_file, model, budget):
+    """Ask one model for the Dockerfile of a project, structured output first, plain text as a fallback"""
+    project_name = project_info['project_name']
+    request = {
+        "model": model,
+        "system": SYSTEM_PROMPT,
+        "prompt": build_prompt(project_info),
+        "options": {
+            "temperature": 0.3,
+            "top_p": 0.9,
+            "top_k": 40,
+            "num_predict": MAX_DOCKERFILE_TOKENS
+        }
+    }
+
+    if STRUCTURED_OUTPUT:
+        structured_request = dict(request, prompt=build_prompt(project_info, structured=True),
+                                  format=DOCKERFILE_SCHEMA)
+        try:
+            return await run_generation(llm, structured_request, project_info, output_file, budget)
+        except ValueError as e:
+            print(f"Invalid structured output for {project_name} ({str(e)}), falling back to plain text")
+
+    return await run_generation(llm, request, project_info, output_file, budget)
+
+def generation_config():
+    """Hash of the settings that shape a generated Dockerfile, its analysis, stored with each run"""
+    config = {
+        'model_chains': MODEL_CHAINS,
+        'system_prompt': SYSTEM_PROMPT,
+        'templates': [TEMPLATE_VERSION, DOCKERFILE_BASE_IMAGES] if USE_TEMPLATES else None,
+        'structured_output': STRUCTURED_OUTPUT,
+        'max_tokens': MAX_DOCKERFILE_TOKENS,
+        'analysis': [LOCAL_DOCKERFILE_ANALYSIS, VERTEX_MODEL, ANALYSIS_PROMPT_VERSION]
+    }
+    return hashlib.sha256(json.dumps(config, sort_keys=True).encode()).hexdigest()
+
+async def generate_dockerfile(llm, project_info):
+    """Generate the Dockerfile of one project and run the rest of the pipeline on it"""
+    # Extract project name from the description
+    # The description format is: "The project 'project-name':"
+    description = project_info['description']
+    project_name = description.split("'")[1]  # Extract name between single quotes
+
+    # Save Dockerfile inside the specific project directory
+    project_dir = os.path.join("outputs", project_name)
+    output_file = os.path.join(project_dir, "Dockerfile")
+
+    # Ensure the project directory exists
+    os.makedirs(project_dir, exist_ok=True)
+
+    # Unchanged project whose whole pipeline already succeeded: restore the stored
+    # Dockerfile and analysis and skip generation, Vertex AI, the image build and the PR
+    # (unless it ran with other models, prompt, templates or analysis settings)
+    previous_run = project_info.get('previous_run') or {}
+    if previous_run.get('pipeline_complete') and previous_run.get('generation_config') == generation_config():
+        with open(output_file, "w") as f:
+            f.write(previous_run['dockerfile'])
+        if previous_run.get('analysis'):
+            write_analysis_file(project_dir, previous_run.get('analysis_title', VERTEX_ANALYSIS_TITLE),
+                                previous_run['analysis'])
+        print(f"{project_name} is unchanged since the last run, reusing the stored result")
+        print(f"Dockerfile has been saved to '{output_file}'")
+        return previous_run
+
+    # Python, Node, C/C++ with a Makefile, Go, Rust and plain Java projects need no LLM
+    dockerfile_content = render_dockerfile_template(project_info) if USE_TEMPLATES else None
+    if dockerfile_content is not None:
+        print(f"Rendered the Dockerfile template for: {project_name}")
+    else:
+        dockerfile_content = await generate_with_llm(llm, project_info, output_file)
+
+    print(f"Generated Dockerfile for {project_name}:")
     print("=" * 30)
     print(dockerfile_content)
     print("=" * 30)
@@ -409,15 +1128,131 @@ try:
         f.write(dockerfile_content)
 
     print(f"\nDockerfile has been saved to '{output_file}'")
-    
-    # Analyze the generated Dockerfile with Vertex AI
-    analyse_dockerfile_with_vertexai(output_file, dockerfile_content)
-    # Create repository for storing images inside artifct registry
-    create_artifact_registry_repository("total-treat-466514-k4", "us-central1", "docker-images")
-
-    # Build and push to GAR
-    build_and_push_to_artifact_registry(project_dir, project_name)
-    #Push the code to Github as Pull Request
-    push_code_back_to_github(project_name,project_dir)
-except Exception as e:
-    print(f"An error occurred: {str(e)}")
+
+    return await deploy_project(project_info, project_name, project_dir, output_file, dockerfile_content)
+
+def route_models(project_info):
+    """Model chain of a project: the fast model first for simple shapes, the large one otherwise"""
+    complex_project = (project_info['type'] == 'unknown'
+                       or len(project_info.get('languages', [])) > 1
+                       or project_info.get('file_count', 0) > COMPLEX_PROJECT_FILES)
+    return MODEL_CHAINS['complex' if complex_project else 'simple']
+
+async def generate_with_llm(llm, project_info, output_file):
+    """Generate the Dockerfile of a project along its model chain, within LATENCY_BUDGET"""
+    project_name = project_info['project_name']
+    loop = asyncio.get_running_loop()
+    # The deadline is set by call_llm, when the project first gets a slot on the server
+    budget = {'deadline': None}
+    models = [model for model in route_models(project_info) if model not in llm['missing_models']]
+    for i, model in enumerate(models):
+        if model in llm['missing_models']:
+            continue
+        if budget['deadline'] is not None and loop.time() >= budget['deadline']:
+            break
+        # Every model but the last one of the chain is cut off after MODEL_TIMEOUT
+        budget['model_timeout'] = MODEL_TIMEOUT if i < len(models) - 1 else LATENCY_BUDGET
+        budget['model_deadline'] = None
+        try:
+            return await generate_with_model(llm, project_info, output_file, model, budget)
+        except asyncio.TimeoutError:
+            print(f"{model} did not answer in time for {project_name}, trying the next model")
+        except ollama.ResponseError as e:
+            if e.status_code != 404:
+                raise
+            llm['missing_models'].add(model)
+            print(f"{model} is not available on the Ollama server, trying the next model")
+        except ValueError as e:
+            print(f"{model} did not generate a usable Dockerfile for {project_name} ({str(e)}), trying the next model")
+    raise TimeoutError(f"no model generated a usable Dockerfile for {project_name} within {LATENCY_BUDGET}s")
+
+async def warm_up_model(client, model):
+    """Load a model on the Ollama server, keep it resident for OLLAMA_KEEP_ALIVE and prime SYSTEM_PROMPT"""
+    try:
+        # A single predicted token is enough to get the system prompt evaluated and cached
+        await client.generate(model=model, system=SYSTEM_PROMPT, prompt="PROJECT DESCRIPTION:",
+                              options={"num_predict": 1}, keep_alive=OLLAMA_KEEP_ALIVE)
+        print(f"Model {model} is loaded")
+    except Exception as e:
+        print(f"Could not warm up {model}: {str(e)}")
+
+async def open_bundle_pull_request(project_infos, results):
+    """Open one pull request for every project of the batch that still needs one, and record it"""
+    project_names = sorted(name for name, run in results.items() if not run.get('pipeline_complete'))
+    if not project_names:
+        return
+    pr_created = bool(await run_stage('pull_request', push_projects_to_github, project_names))
+    for project_name in project_names:
+        run = results[project_name]
+        run['pr_created'] = pr_created
+        run['pipeline_complete'] = bool(run['analysis'] and run['image_pushed'] and pr_created)
+        record_project_run(project_infos[project_name], pr_created=pr_created,
+                           pipeline_complete=run['pipeline_complete'])
+
+async def generate_all(analyses, client=None, concurrency=OLLAMA_CONCURRENCY):
+    """Run the pipeline on every analysis, returns (results, errors) keyed by project"""
+    # One client for the whole batch, its connections are pooled and reused
+    if client is None:
+        client = ollama.AsyncClient(host=OLLAMA_HOST)
+    if WARM_UP_MODEL:
+        # The first model of each chain serves most generations
+        first_models = dict.fromkeys(chain[0] for chain in MODEL_CHAINS.values())
+        warm_up = asyncio.gather(*(warm_up_model(client, model) for model in first_models))
+
+    # State shared by every generation of the batch
+    llm = {
+        'client': client,
+        'semaphore': asyncio.Semaphore(concurrency),
+        'response_cache': ResponseCache(bypass=BYPASS_RESPONSE_CACHE),
+        'generations': {},  # canonical request key -> running or finished generation
+        'missing_models': set()  # models the server doesn't have, skipped by the routing
+    }
+    loop = asyncio.get_running_loop()
+    tasks = {}
+    errors = {}
+    project_infos = {}
+
+    # Start each generation as soon as its analysis is ready,
+    # the next projects keep being analyzed in the meantime
+    while True:
+        project_info = await loop.run_in_executor(None, next, analyses, None)
+        if project_info is None:
+            break
+        if 'error' in project_info:
+            # The analysis failed, report the project with the failed generations
+            errors[project_info['project_name']] = project_info['error']
+            continue
+        project_infos[project_info['project_name']] = project_info
+        tasks[project_info['project_name']] = asyncio.ensure_future(
+            generate_dockerfile(llm, project_info))
+
+    results = {}
+    outcomes = await asyncio.gather(*tasks.values(), return_exceptions=True)
+    llm['response_cache'].close()
+    if WARM_UP_MODEL:
+        await warm_up
+    for project_name, outcome in zip(tasks, outcomes):
+        if isinstance(outcome, Exception):
+            print(f"An error occurred for {project_name}: {str(outcome)}")
+            errors[project_name] = str(outcome)
+        else:
+            results[project_name] = outcome
+
+    if BUNDLE_PULL_REQUESTS:
+        await open_bundle_pull_request(project_infos, results)
+    return results, errors
+
+if __name__ == "__main__":
+    results, errors = asyncio.run(generate_all(iter_analyses()))
+
+    # Check if any projects were found
+    if not results and not errors:
+        print("No projects found in the directory.")
+        print("Please make sure there are project directories to analyze.")
+        exit(1)
+
+    print("=" * 60)
+    completed = [name for name, run in results.items() if run.get('pipeline_complete')]
+    print(f"Pipelines completed: {len(completed)}, incomplete: {len(results) - len(completed)}, failed: {len(errors)}")
+    for project_name, error in errors.items():
+        print(f"  {project_name}: {error}")
@@ -1,7 +1,13 @@
 import os
-import glob
 import shutil
 import re
+import mmap
+import sqlite3
+import hashlib
+import time
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 import json  
 from google.cloud import pubsub_v1
 from git import Repo 
@@ -53,89 +59,598 @@ def start_listening():
     except KeyboardInterrupt:
         print("Shutting down subscriber...")
 
-def analyze_project_files(dest_path):
-    """Analyze all file types in the project"""
-    file_analysis = {}
-    
-    # Python files
-    py_files = [f for f in glob.glob(os.path.join(dest_path,"**", "*.py"), recursive=True) if "node_modules" not in f ]
-    py_requirements = glob.glob(os.path.join(dest_path, "**", "requirements.txt"), recursive=True)
-    file_analysis['python'] = {
-        'files': [os.path.basename(f) for f in py_files] if py_files else [],
-        'has_requirements': bool(py_requirements),
-        'count': len(py_files)
-    }
+try:
+    import fcntl
+except ImportError:  # Windows, no reflinks
+    fcntl = None
+
+try:
+    import tomllib
+except ImportError:  # Python < 3.11, fall back to parse_simple_toml
+    tomllib = None
+
+# On-disk cache shared by every run (analysis results, fingerprints, ...)
+CACHE_DIR = os.path.join("outputs", ".cache")
+ANALYSIS_CACHE_DB = "analysis.sqlite"
+FILE_CACHE_COLUMNS = ['project', 'path', 'mtime_ns', 'size', 'inode', 'language', 'interactive', 'digest', 'manifest']
+
+# LLM response cache: bounded number of entries (least recently used evicted first) and their lifetime
+RESPONSE_CACHE_DB = "responses.sqlite"
+RESPONSE_CACHE_MAX_ENTRIES = 1000
+RESPONSE_CACHE_TTL = 30 * 24 * 3600  # seconds
+
+# The project name is masked out of cached prompts so same-shaped projects share a response
+PROMPT_PROJECT_NAME_RE = re.compile(r"The project '[^'\n]*':")
+
+# How projects are staged into outputs/: "move", "link" (reflinks or hard links) or "copy"
+STAGING_MODE = "link"
+
+# ioctl request cloning a file's extents (copy-on-write) on btrfs, XFS and friends
+FICLONE = 0x40049409
+
+# Whether reflinks work, per device id; filled on first use
+REFLINK_SUPPORT = {}
+
+# Files the pipeline writes into a staged project, never hard-linked
+GENERATED_FILES = {'Dockerfile', 'Dockerfile_Analysis.txt'}
+
+# Number of processes used to analyze projects (None = number of CPU cores)
+ANALYSIS_WORKERS = None
+
+# Start method of the analysis processes. The Ollama scripts drive the pool from a worker
+# thread while their event loop, HTTP client and SQLite connections are live, and forking
+# a multi-threaded process can deadlock the child
+ANALYSIS_START_METHOD = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+# Bump whenever the analysis logic changes so stored fingerprints stop matching
+ANALYSIS_VERSION = "7"
+
+# Directories that never contain project sources and are pruned before descending
+SKIP_DIRS = {'node_modules', '.git', 'target', 'vendor', '__pycache__', '.venv', 'venv'}
+
+# Compiled .gitignore / .dockerignore rules, keyed by (path, mtime, size) of the ignore file
+IGNORE_RULES_CACHE = {}
+
+# Source file extensions and the language bucket they belong to
+LANGUAGE_EXTENSIONS = {
+    '.py': 'python',
+    '.java': 'java',
+    '.js': 'javascript',
+    '.ts': 'typescript',
+    '.c': 'c',
+    '.cpp': 'cpp',
+    '.go': 'go',
+    '.rs': 'rust'
+}
+
+# Build manifests looked up anywhere in the project tree and parsed into the manifest index
+MANIFEST_FILES = {
+    'Makefile', 'requirements.txt', 'pyproject.toml', 'package.json', 'tsconfig.json',
+    'go.mod', 'Cargo.toml', 'pom.xml', 'build.gradle', 'build.gradle.kts'
+}
+
+# Per-language file sample kept by the analysis; the full inventory is re-walked on request
+MAX_SAMPLE_FILES = 20
+
+# File stems that usually mark a program's entry point, best first
+ENTRY_POINT_STEMS = ['main', '__main__', 'app', 'index', 'server', 'cli', 'run', 'start', 'program', 'lib']
+
+# Files whose content feeds the analysis, and therefore the project fingerprint
+FINGERPRINT_EXTENSIONS = set(LANGUAGE_EXTENSIONS) | {'.cc', '.cxx', '.mk', '.make'}
+FINGERPRINT_FILES = MANIFEST_FILES | {'.gitignore', '.dockerignore'}
+
+def open_cache_db(db_name=ANALYSIS_CACHE_DB, cache_dir=CACHE_DIR):
+    """Open (and create if needed) a SQLite database inside the cache directory"""
+    os.makedirs(cache_dir, exist_ok=True)
+    conn = sqlite3.connect(os.path.join(cache_dir, db_name), timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
+
+def open_analysis_cache(cache_dir=CACHE_DIR):
+    """Open the per-file analysis cache"""
+    conn = open_cache_db(ANALYSIS_CACHE_DB, cache_dir)
     
-    # Java files
-    java_files = glob.glob(os.path.join(dest_path, "**","*.java"), recursive=True)
-    file_analysis['java'] = {
-        'files': [os.path.basename(f) for f in java_files] if java_files else [],
-        'count': len(java_files)
-    }
+    # It's only a cache: a table written by an older layout is dropped and rebuilt
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(file_cache)")]
+    if columns and columns != FILE_CACHE_COLUMNS:
+        conn.execute("DROP TABLE file_cache")
     
-    # JavaScript files
-    js_files = [f for f in glob.glob(os.path.join(dest_path, "**","*.js"), recursive=True) if "node_modules" not in f]
-    js_config = glob.glob(os.path.join(dest_path, "**", "package.json"), recursive=True)
-    file_analysis['javascript'] = {
-        'files': [os.path.basename(f) for f in js_files] if js_files else [],
-        'has_package_json': bool(js_config),
-        'count': len(js_files)
-    }
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS file_cache (
+            project TEXT NOT NULL,
+            path TEXT NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            size INTEGER NOT NULL,
+            inode INTEGER NOT NULL,
+            language TEXT,
+            interactive TEXT,
+            digest TEXT,
+            manifest TEXT,
+            PRIMARY KEY (project, path)
+        )""")
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS project_runs (
+            project TEXT PRIMARY KEY,
+            fingerprint TEXT NOT NULL,
+            result TEXT NOT NULL,
+            updated_at REAL NOT NULL
+        )""")
+    conn.commit()
+    return conn
+
+class FileCache:
+    """Per-project view of the analysis cache, keyed on (relative path, mtime, size, inode)
+
+    A record's 'interactive' field is None when the file was never scanned,
+    '' when it was scanned without a match, and the matching pattern otherwise.
+    """
+
+    def __init__(self, conn, dest_path):
+        self.conn = conn
+        self.dest_path = dest_path
+        self.project = os.path.basename(os.path.normpath(dest_path))
+        self.records = {}
+        self.dirty = set()
+        rows = conn.execute(
+            "SELECT path, mtime_ns, size, inode, language, interactive, digest, manifest FROM file_cache WHERE project = ?",
+            (self.project,))
+        for path, mtime_ns, size, inode, language, interactive, digest, manifest in rows:
+            self.records[path] = {
+                'key': (mtime_ns, size, inode),
+                'language': language,
+                'interactive': interactive,
+                'digest': digest,
+                'manifest': manifest
+            }
+
+    def relpath(self, entry):
+        return os.path.relpath(entry.path, self.dest_path).replace(os.sep, '/')
+
+    def get(self, entry):
+        """Return the record for a file, starting a fresh one if the file changed since it was cached"""
+        rel = self.relpath(entry)
+        stat = entry.stat()
+        key = (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+        record = self.records.get(rel)
+        if record is None or record['key'] != key:
+            record = {'key': key, 'language': None, 'interactive': None, 'digest': None, 'manifest': None}
+            self.records[rel] = record
+            self.dirty.add(rel)
+        return record
+
+    def update(self, entry, **fields):
+        rel = self.relpath(entry)
+        self.records[rel].update(fields)
+        self.dirty.add(rel)
+
+    def prune(self, seen_paths):
+        """Forget files that no longer exist in the project"""
+        for rel in set(self.records) - set(seen_paths):
+            del self.records[rel]
+            self.conn.execute("DELETE FROM file_cache WHERE project = ? AND path = ?", (self.project, rel))
+
+    def save(self):
+        rows = []
+        for rel in self.dirty:
+            record = self.records.get(rel)
+            if record is not None:
+                rows.append((self.project, rel, *record['key'], record['language'], record['interactive'],
+                             record['digest'], record['manifest']))
+        self.conn.executemany("INSERT OR REPLACE INTO file_cache VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        self.conn.commit()
+        self.dirty.clear()
+
+def normalize_prompt(prompt):
+    """Canonical form of a prompt for the response cache: no project name, no whitespace noise"""
+    prompt = PROMPT_PROJECT_NAME_RE.sub("The project '<project>':", prompt)
+    lines = [' '.join(line.split()) for line in prompt.strip().splitlines()]
+    return '\n'.join(line for line in lines if line)
+
+def canonical_description(project_info):
+    """The parts of an analysis that decide its Dockerfile, the key of shared LLM responses
+
+    Language, dependencies, build system, executable and interactivity: projects
+    that only differ by name or by their file sample get the same Dockerfile.
+    """
+    return "\n".join([
+        f"- Language: {project_info['type'].upper()}",
+        f"- Main executable: {project_info.get('executable_name')}",
+        f"- Dependency file: {project_info['dependency_file'] if project_info['has_dependencies'] else 'none'}",
+        f"- Build system: {project_info.get('build_system') or 'none'}",
+        f"- Interactive: {'yes' if project_info.get('is_interactive') else 'no'}"
+    ])
+
+class ResponseCache:
+    """Persistent LLM response cache keyed by hash(model, normalized prompt, options)
+
+    Entries older than ttl seconds are ignored and dropped, and only the
+    max_entries most recently used ones are kept. With bypass=True lookups
+    always miss but fresh responses are still stored.
+    """
+
+    def __init__(self, cache_dir=CACHE_DIR, max_entries=RESPONSE_CACHE_MAX_ENTRIES,
+                 ttl=RESPONSE_CACHE_TTL, bypass=False):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.bypass = bypass
+        self.conn = open_cache_db(RESPONSE_CACHE_DB, cache_dir)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                used_at REAL NOT NULL
+            )""")
+        self.conn.commit()
+
+    def key(self, model, prompt, **options):
+        """Hash a generation request; every keyword (options, system, format, ...) is part of the key"""
+        request = {'model': model, 'prompt': normalize_prompt(prompt), 'options': options}
+        return hashlib.sha256(json.dumps(request, sort_keys=True).encode()).hexdigest()
+
+    def get(self, key):
+        if self.bypass:
+            return None
+        row = self.conn.execute("SELECT response, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        if now - row[1] > self.ttl:
+            self.conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self.conn.commit()
+            return None
+        self.conn.execute("UPDATE responses SET used_at = ? WHERE key = ?", (now, key))
+        self.conn.commit()
+        return row[0]
+
+    def put(self, key, response):
+        now = time.time()
+        self.conn.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)", (key, response, now, now))
+        # Drop expired entries, then everything past the most recently used max_entries
+        self.conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl,))
+        self.conn.execute("""
+            DELETE FROM responses WHERE key NOT IN (
+                SELECT key FROM responses ORDER BY used_at DESC LIMIT ?
+            )""", (self.max_entries,))
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+def translate_ignore_pattern(pattern):
+    """Translate a gitignore-style glob into a regex over '/'-separated relative paths"""
+    i, n = 0, len(pattern)
+    regex = []
+    while i < n:
+        c = pattern[i]
+        if pattern.startswith('**/', i):
+            # Zero or more directories
+            regex.append('(?:.*/)?')
+            i += 3
+            continue
+        if pattern.startswith('**', i):
+            regex.append('.*')
+            i += 2
+            continue
+        if c == '*':
+            regex.append('[^/]*')
+        elif c == '?':
+            regex.append('[^/]')
+        elif c == '[' and pattern.find(']', i + 1) != -1:
+            j = pattern.find(']', i + 1)
+            body = pattern[i + 1:j]
+            if body.startswith('!'):
+                body = '^' + body[1:]
+            regex.append(f'[{body}]')
+            i = j
+        elif c == '\\' and i + 1 < n:
+            i += 1
+            regex.append(re.escape(pattern[i]))
+        else:
+            regex.append(re.escape(c))
+        i += 1
+    return ''.join(regex)
+
+def load_ignore_rules(path, docker=False):
+    """Compile an ignore file into (regex, negate, dir_only, pattern) rules, cached by path, mtime and size
     
-    # TypeScript files
-    ts_files = [f for f in glob.glob(os.path.join(dest_path, "**", "*.ts"), recursive=True) if "node_modules" not in f]
-    ts_config = glob.glob(os.path.join(dest_path, "**", "tsconfig.json"), recursive=True)
-    file_analysis['typescript'] = {
-        'files': [os.path.basename(f) for f in ts_files] if ts_files else [],
-        'has_tsconfig': bool(ts_config),
-        'count': len(ts_files)
-    }
+    .gitignore patterns without a slash match at any depth below the file's directory;
+    .dockerignore patterns are always relative to the build context root and, like
+    docker, also match everything below the path they name.
+    """
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return []
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    if key in IGNORE_RULES_CACHE:
+        return IGNORE_RULES_CACHE[key]
     
-    # C files
-    c_files = [f for f in glob.glob(os.path.join(dest_path,"**", "*.c"), recursive=True) if "node_modules" not in f]
-    file_analysis['c'] = {
-        'files': [os.path.basename(f) for f in c_files] if c_files else [],
-        'count': len(c_files)
-    }
+    rules = []
+    with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+        for line in f:
+            line = line.rstrip('\r\n')
+            if not line.strip() or line.startswith('#'):
+                continue
+            if not line.endswith('\\ '):
+                line = line.rstrip()
+            
+            negate = line.startswith('!')
+            if negate:
+                line = line[1:]
+            
+            if docker:
+                line = line.strip().strip('/')
+                dir_only = False
+                anchored = True
+            else:
+                dir_only = line.endswith('/')
+                line = line.rstrip('/')
+                anchored = '/' in line
+                line = line.lstrip('/')
+            if not line:
+                continue
+            
+            regex = translate_ignore_pattern(line)
+            if not anchored:
+                regex = '(?:.*/)?' + regex
+            if docker:
+                regex += '(?:/.*)?'
+            rules.append((re.compile(regex + r'\Z'), negate, dir_only, line))
     
-    # C++ files
-    cpp_files = [f for f in glob.glob(os.path.join(dest_path,"**" ,"*.cpp"), recursive=True) if "node_modules" not in f]
-    file_analysis['cpp'] = {
-        'files': [os.path.basename(f) for f in cpp_files] if cpp_files else [],
-        'count': len(cpp_files)
-    }
+    IGNORE_RULES_CACHE[key] = rules
+    return rules
+
+def is_ignored(rule_sets, rel_path, is_dir):
+    """Apply (base directory, rules) sets in order; the last matching pattern decides"""
+    ignored = False
+    for base, rules in rule_sets:
+        if base:
+            if not rel_path.startswith(base + '/'):
+                continue
+            path = rel_path[len(base) + 1:]
+        else:
+            path = rel_path
+        for regex, negate, dir_only, _ in rules:
+            if dir_only and not is_dir:
+                continue
+            if regex.match(path):
+                ignored = not negate
+    return ignored
+
+def may_reinclude_below(rule_sets, rel_dir):
+    """Whether a negation ('!') pattern can re-include files below an excluded directory"""
+    dir_prefix = rel_dir + '/'
+    for _, rules in rule_sets:
+        for _, negate, _, pattern in rules:
+            if not negate:
+                continue
+            literal = re.split(r'[*?[\\]', pattern, 1)[0]
+            if literal.startswith(dir_prefix):
+                return True
+            # A wildcard before the end of the directory path only reaches below it across a '/'
+            if dir_prefix.startswith(literal) and ('/' in pattern[len(literal):] or '**' in pattern):
+                return True
+    return False
+
+def iter_project_files(dest_path):
+    """Walk the project once with os.scandir, yielding file entries
     
-    # Go files
-    go_files = glob.glob(os.path.join(dest_path,"**", "*.go"), recursive=True)
-    file_analysis['go'] = {
-        'files': [os.path.basename(f) for f in go_files] if go_files else [],
-        'count': len(go_files)
-    }
+    SKIP_DIRS and anything excluded by the project's .gitignore files (each one
+    applying to its own directory) or its root .dockerignore is pruned before
+    descending, so ignored trees are never read. A directory excluded by the
+    .dockerignore is still walked when a '!' pattern re-includes files in it,
+    docker sends those files with the build context.
+    """
+    docker_rules = [('', load_ignore_rules(os.path.join(dest_path, '.dockerignore'), docker=True))]
+    stack = [(dest_path, '', [])]
+    while stack:
+        current, rel_dir, git_rules = stack.pop()
+        try:
+            with os.scandir(current) as it:
+                entries = sorted(it, key=lambda e: e.name)
+        except OSError:
+            continue
+        
+        if any(entry.name == '.gitignore' for entry in entries):
+            git_rules = git_rules + [(rel_dir, load_ignore_rules(os.path.join(current, '.gitignore')))]
+        check_ignores = bool(git_rules) or bool(docker_rules[0][1])
+        
+        subdirs = []
+        for entry in entries:
+            rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name in SKIP_DIRS:
+                        continue
+                    if check_ignores and (is_ignored(git_rules, rel_path, True) or
+                                          (is_ignored(docker_rules, rel_path, True) and
+                                           not may_reinclude_below(docker_rules, rel_path))):
+                        continue
+                    subdirs.append((entry.path, rel_path, git_rules))
+                elif entry.is_file():
+                    if check_ignores and (is_ignored(git_rules, rel_path, False) or is_ignored(docker_rules, rel_path, False)):
+                        continue
+                    yield entry
+            except OSError:
+                continue
+        
+        # Reversed so that directories are visited in name order
+        stack.extend(reversed(subdirs))
+
+def entry_point_rank(rel_path):
+    """Sort key putting entry-point-like files (main.py, index.js, Main.java, ...) first, then shallower files"""
+    name = rel_path.rsplit('/', 1)[-1]
+    stem = name.split('.')[0].lower()
+    priority = ENTRY_POINT_STEMS.index(stem) if stem in ENTRY_POINT_STEMS else len(ENTRY_POINT_STEMS)
+    return (name.endswith('.d.ts'), priority, rel_path.count('/'), rel_path)
+
+def add_to_sample(sample, rel_path):
+    """Add a file to a ranked sample, trimming it back to MAX_SAMPLE_FILES once it doubles"""
+    sample.append(rel_path)
+    if len(sample) >= 2 * MAX_SAMPLE_FILES:
+        sample.sort(key=entry_point_rank)
+        del sample[MAX_SAMPLE_FILES:]
+
+def iter_language_files(dest_path, language):
+    """Yield the relative path of every file of a language (the full inventory behind the sample)"""
+    for entry in iter_project_files(dest_path):
+        if LANGUAGE_EXTENSIONS.get(os.path.splitext(entry.name)[1]) == language:
+            yield os.path.relpath(entry.path, dest_path).replace(os.sep, '/')
+
+def format_file_sample(language_analysis):
+    """Render a language's file sample for the description, noting how many files were left out"""
+    files_str = ", ".join(language_analysis['files'])
+    remaining = language_analysis['count'] - len(language_analysis['files'])
+    if remaining > 0:
+        files_str += f" and {remaining} more"
+    return files_str
+
+def analyze_project_files(dest_path, file_cache=None):
+    """Analyze all file types in the project
     
-    # Rust files
-    rust_files = glob.glob(os.path.join(dest_path,"**", "*.rs"), recursive=True)
-    file_analysis['rust'] = {
-        'files': [os.path.basename(f) for f in rust_files] if rust_files else [],
-        'count': len(rust_files)
-    }
+    Each language keeps its file count and a sample of at most MAX_SAMPLE_FILES
+    relative paths ranked by entry_point_rank; use iter_language_files for the rest.
+    """
+    files_by_language = {language: [] for language in LANGUAGE_EXTENSIONS.values()}
+    counts = {language: 0 for language in LANGUAGE_EXTENSIONS.values()}
+    manifest_entries = {}
+    seen_paths = []
+    
+    # Classify every file into its language bucket in a single pass
+    for entry in iter_project_files(dest_path):
+        rel_path = os.path.relpath(entry.path, dest_path).replace(os.sep, '/')
+        if file_cache is not None:
+            seen_paths.append(rel_path)
+        if entry.name in MANIFEST_FILES:
+            manifest_entries.setdefault(entry.name, []).append(entry)
+        
+        extension = os.path.splitext(entry.name)[1]
+        if extension not in LANGUAGE_EXTENSIONS:
+            continue
+        
+        if file_cache is not None:
+            record = file_cache.get(entry)
+            if record['language'] is None:
+                file_cache.update(entry, language=LANGUAGE_EXTENSIONS[extension])
+            language = record['language']
+        else:
+            language = LANGUAGE_EXTENSIONS[extension]
+        counts[language] += 1
+        add_to_sample(files_by_language[language], rel_path)
+    
+    # Parse build manifests once; determine_project_type and main() read from this record
+    manifests = build_manifest_index(dest_path, manifest_entries, file_cache)
+    
+    if file_cache is not None:
+        file_cache.prune(seen_paths)
+    
+    file_analysis = {'manifests': manifests}
+    for language, files in files_by_language.items():
+        file_analysis[language] = {
+            'files': sorted(files, key=entry_point_rank)[:MAX_SAMPLE_FILES],
+            'count': counts[language]
+        }
+    
+    file_analysis['python']['has_requirements'] = bool(manifests['python']['requirements'])
+    file_analysis['javascript']['has_package_json'] = manifests['package_json'] is not None
+    file_analysis['typescript']['has_tsconfig'] = manifests['tsconfig'] is not None
     
     # Build systems
     file_analysis['build_system'] = {
-        'has_makefile': os.path.exists(os.path.join(dest_path, "Makefile")),
-        'has_package_json': bool(js_config),
-        'has_requirements': bool(py_requirements),
-        'has_tsconfig': bool(ts_config)
+        'has_makefile': manifests['makefile'] is not None,
+        'has_package_json': manifests['package_json'] is not None,
+        'has_requirements': bool(manifests['python']['requirements']),
+        'has_tsconfig': manifests['tsconfig'] is not None,
+        'has_go_mod': manifests['go_mod'] is not None,
+        'has_cargo_toml': manifests['cargo'] is not None,
+        'java_build_tool': manifests['java']['build_tool'] if manifests['java'] else None
     }
     
     return file_analysis
 
+def hash_file(path):
+    """Return the sha256 hex digest of a file's content"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def compute_project_fingerprint(dest_path, file_cache=None):
+    """Merkle-style fingerprint over the files that feed the project analysis
+    
+    Each relevant file is hashed (reusing cached digests of unchanged files),
+    every directory hashes the sorted (name, hash) pairs of its children and
+    the root hash is combined with the project name and ANALYSIS_VERSION.
+    """
+    children = {}
+    for entry in iter_project_files(dest_path):
+        extension = os.path.splitext(entry.name)[1].lower()
+        if extension not in FINGERPRINT_EXTENSIONS and entry.name not in FINGERPRINT_FILES:
+            continue
+        
+        try:
+            if file_cache is not None:
+                record = file_cache.get(entry)
+                if record['digest'] is None:
+                    file_cache.update(entry, digest=hash_file(entry.path))
+                digest = record['digest']
+            else:
+                digest = hash_file(entry.path)
+        except OSError:
+            continue
+        
+        rel_dir = os.path.relpath(os.path.dirname(entry.path), dest_path).replace(os.sep, '/')
+        children.setdefault(rel_dir, []).append((entry.name, 'f', digest))
+    
+    # Fold directory hashes upwards, deepest directories first
+    for rel_dir in sorted(children, key=lambda d: d.count('/'), reverse=True):
+        if rel_dir == '.':
+            continue
+        dir_hash = hashlib.sha256()
+        for name, kind, digest in sorted(children[rel_dir]):
+            dir_hash.update(f"{name}\0{kind}\0{digest}\n".encode())
+        parent, name = os.path.split(rel_dir)
+        children.setdefault(parent or '.', []).append((name, 'd', dir_hash.hexdigest()))
+    
+    root_hash = hashlib.sha256(f"{ANALYSIS_VERSION}\0{os.path.basename(os.path.normpath(dest_path))}\n".encode())
+    for name, kind, digest in sorted(children.get('.', [])):
+        root_hash.update(f"{name}\0{kind}\0{digest}\n".encode())
+    return root_hash.hexdigest()
+
+def load_project_run(conn, project, fingerprint):
+    """Return the stored run of a project if it was recorded for the same fingerprint"""
+    row = conn.execute("SELECT fingerprint, result FROM project_runs WHERE project = ?", (project,)).fetchone()
+    if row is None or row[0] != fingerprint:
+        return None
+    return json.loads(row[1])
+
+def save_project_run(conn, project, fingerprint, result):
+    conn.execute("INSERT OR REPLACE INTO project_runs VALUES (?, ?, ?, ?)",
+                 (project, fingerprint, json.dumps(result), time.time()))
+    conn.commit()
+
+def record_project_run(project_info, **results):
+    """Merge pipeline results (Dockerfile, analysis, image, PR, ...) into the stored run of a project"""
+    conn = open_analysis_cache()
+    try:
+        project = project_info['project_name']
+        fingerprint = project_info['fingerprint']
+        run = load_project_run(conn, project, fingerprint) or {}
+        run.update(results)
+        save_project_run(conn, project, fingerprint, run)
+    finally:
+        conn.close()
+
 def determine_project_type(project_name, file_analysis):
     """Determine project type and generate description for LLM"""
     build_system = file_analysis['build_system']
+    manifests = file_analysis['manifests']
     
     # Priority order for determining primary language
     if file_analysis['python']['count'] > 0:
-        files_str = ", ".join(file_analysis['python']['files'])
+        files_str = format_file_sample(file_analysis['python'])
         if file_analysis['python']['has_requirements']:
             return {
                 'type': 'python',
@@ -154,7 +669,7 @@ def determine_project_type(project_name, file_analysis):
             }
     
     elif file_analysis['javascript']['count'] > 0:
-        files_str = ", ".join(file_analysis['javascript']['files'])
+        files_str = format_file_sample(file_analysis['javascript'])
         if file_analysis['javascript']['has_package_json']:
             return {
                 'type': 'javascript',
@@ -173,7 +688,7 @@ def determine_project_type(project_name, file_analysis):
             }
     
     elif file_analysis['typescript']['count'] > 0:
-        files_str = ", ".join(file_analysis['typescript']['files'])
+        files_str = format_file_sample(file_analysis['typescript'])
         if file_analysis['typescript']['has_tsconfig']:
             return {
                 'type': 'typescript',
@@ -182,19 +697,38 @@ def determine_project_type(project_name, file_analysis):
                 'has_dependencies': file_analysis['javascript']['has_package_json'],
                 'dependency_file': 'package.json' if file_analysis['javascript']['has_package_json'] else None
             }
+        else:
+            return {
+                'type': 'typescript',
+                'description': f"{project_name}: TypeScript project without tsconfig.json",
+                'files': files_str,
+                'has_dependencies': file_analysis['javascript']['has_package_json'],
+                'dependency_file': 'package.json' if file_analysis['javascript']['has_package_json'] else None
+            }
     
     elif file_analysis['java']['count'] > 0:
-        files_str = ", ".join(file_analysis['java']['files'])
-        return {
-            'type': 'java',
-            'description': f"{project_name}: Java project without dependencies",
-            'files': files_str,
-            'has_dependencies': False,
-            'dependency_file': None
-        }
+        files_str = format_file_sample(file_analysis['java'])
+        java_manifest = manifests['java']
+        if java_manifest:
+            dependency_file = os.path.basename(java_manifest['path'])
+            return {
+                'type': 'java',
+                'description': f"{project_name}: Java project with {dependency_file}",
+                'files': files_str,
+                'has_dependencies': True,
+                'dependency_file': dependency_file
+            }
+        else:
+            return {
+                'type': 'java',
+                'description': f"{project_name}: Java project without dependencies",
+                'files': files_str,
+                'has_dependencies': False,
+                'dependency_file': None
+            }
     
     elif file_analysis['c']['count'] > 0:
-        files_str = ", ".join(file_analysis['c']['files'])
+        files_str = format_file_sample(file_analysis['c'])
         if build_system['has_makefile']:
             return {
                 'type': 'c',
@@ -213,7 +747,7 @@ def determine_project_type(project_name, file_analysis):
             }
     
     elif file_analysis['cpp']['count'] > 0:
-        files_str = ", ".join(file_analysis['cpp']['files'])
+        files_str = format_file_sample(file_analysis['cpp'])
         if build_system['has_makefile']:
             return {
                 'type': 'cpp',
@@ -232,15 +766,25 @@ def determine_project_type(project_name, file_analysis):
             }
     
     elif file_analysis['go']['count'] > 0:
-        files_str = ", ".join(file_analysis['go']['files'])
+        files_str = format_file_sample(file_analysis['go'])
         if build_system['has_makefile']:
             return {
                 'type': 'go',
                 'description': f"{project_name}: Go project with Makefile",
                 'files': files_str,
-                'has_dependencies': False,
+                'has_dependencies': build_system['has_go_mod'],
+                'dependency_file': 'go.mod' if build_system['has_go_mod'] else None,
                 'build_system': 'Makefile'
             }
+        elif build_system['has_go_mod']:
+            return {
+                'type': 'go',
+                'description': f"{project_name}: Go project with go.mod",
+                'files': files_str,
+                'has_dependencies': True,
+                'dependency_file': 'go.mod',
+                'build_system': None
+            }
         else:
             return {
                 'type': 'go',
@@ -251,14 +795,23 @@ def determine_project_type(project_name, file_analysis):
             }
     
     elif file_analysis['rust']['count'] > 0:
-        files_str = ", ".join(file_analysis['rust']['files'])
-        return {
-            'type': 'rust',
-            'description': f"{project_name}: Rust project without dependencies",
-            'files': files_str,
-            'has_dependencies': False,
-            'dependency_file': None
-        }
+        files_str = format_file_sample(file_analysis['rust'])
+        if build_system['has_cargo_toml']:
+            return {
+                'type': 'rust',
+                'description': f"{project_name}: Rust project with Cargo.toml",
+                'files': files_str,
+                'has_dependencies': True,
+                'dependency_file': 'Cargo.toml'
+            }
+        else:
+            return {
+                'type': 'rust',
+                'description': f"{project_name}: Rust project without dependencies",
+                'files': files_str,
+                'has_dependencies': False,
+                'dependency_file': None
+            }
     
     else:
         return {
@@ -269,327 +822,903 @@ def determine_project_type(project_name, file_analysis):
             'dependency_file': None
         }
 
-def parse_makefile_target(dest_path):
-    """Parse Makefile to find the main target - COMPREHENSIVE"""
-    makefile_path = os.path.join(dest_path, "Makefile")
+# Bump whenever template_build_steps or the templates change so stored Dockerfiles are regenerated
+TEMPLATE_VERSION = "1"
+
+# Base images used by the Dockerfile templates, same table as the LLM prompt
+DOCKERFILE_BASE_IMAGES = {
+    'python': 'python:3.12',
+    'javascript': 'node:20',
+    'typescript': 'node:20-slim',
+    'java': 'openjdk:21',
+    'go': 'golang:1.23',
+    'rust': 'rust:latest',
+    'c': 'gcc:14',
+    'cpp': 'gcc:14'
+}
+
+# JSON schema of a structured (Ollama 'format') Dockerfile generation
+DOCKERFILE_SCHEMA = {
+    'type': 'object',
+    'properties': {
+        'base_image': {'type': 'string'},
+        'dependency_commands': {'type': 'array', 'items': {'type': 'string'}},
+        'build_commands': {'type': 'array', 'items': {'type': 'string'}},
+        'cmd': {'type': 'array', 'items': {'type': 'string'}},
+        'expose': {'type': 'array', 'items': {'type': 'integer'}}
+    },
+    'required': ['base_image', 'dependency_commands', 'build_commands', 'cmd']
+}
+
+# image[:tag][@digest], optionally prefixed by a registry host and a namespace
+DOCKER_IMAGE_RE = re.compile(r'^[\w.-]+(?::\d+)?(?:/[\w.-]+)*(?::\w[\w.-]{0,127})?(?:@sha256:[0-9a-f]{64})?$')
+
+def is_entry_point(rel_path):
+    """Whether a file is named like a program entry point (main.py, App.java, ...), lib.* is not one"""
+    stem = rel_path.rsplit('/', 1)[-1].split('.')[0].lower()
+    return stem in ENTRY_POINT_STEMS and stem != 'lib'
+
+def template_build_steps(project_info):
+    """Build commands (RUN) and CMD of a project shape the analysis fully understands, else None"""
+    manifests = project_info.get('manifests') or {}
+    language = project_info['type']
+    executable = project_info.get('executable_name') or ''
+    
+    if language in ('c', 'cpp'):
+        # Only a root Makefile with a target found in it says what `make` produces
+        makefile = manifests.get('makefile')
+        if project_info.get('build_system') != 'Makefile' or not makefile or not makefile['target']:
+            return None
+        return ["make"], ["./" + makefile['target']]
+    
+    if language == 'python':
+        requirements = manifests.get('python', {}).get('requirements', [])
+        # The executable is the first sampled file, which may be any module of a package
+        if not executable.endswith('.py') or not is_entry_point(executable):
+            return None
+        if project_info['has_dependencies']:
+            if 'requirements.txt' not in requirements:
+                return None
+            return ["pip install --no-cache-dir -r requirements.txt"], ["python", executable]
+        # A pyproject.toml (or a nested requirements file) may hide dependencies
+        if requirements or manifests.get('python', {}).get('pyproject'):
+            return None
+        return [], ["python", executable]
+    
+    if language == 'javascript':
+        package_json = manifests.get('package_json')
+        if not project_info['has_dependencies'] or not package_json or package_json['path'] != 'package.json':
+            return None
+        if 'start' in package_json['scripts']:
+            return ["npm install"], ["npm", "start"]
+        if package_json['main']:
+            return ["npm install"], ["node", package_json['main']]
+        return None
+    
+    if language == 'go':
+        go_mod = manifests.get('go_mod')
+        if project_info.get('build_system') == 'Makefile' or not go_mod or go_mod['path'] != 'go.mod':
+            return None
+        # `go build .` needs the main package at the root, not only under cmd/<name>/
+        if not any('/' not in path for path in project_info.get('file_list', [])):
+            return None
+        return ["go build -o main ."], ["./main"]
+    
+    if language == 'rust':
+        cargo = manifests.get('cargo')
+        if not cargo or cargo['path'] != 'Cargo.toml' or not cargo['name']:
+            return None
+        binary = cargo['bins'][0] if cargo['bins'] else cargo['name']
+        return ["cargo build --release"], ["./target/release/" + binary]
     
+    if language == 'java':
+        # Plain javac projects whose main class sits at the root, in the default package
+        if manifests.get('java') or '/' in executable or not executable.endswith('.java'):
+            return None
+        # The name heuristic picks any class containing 'main' or 'app' (Mapper.java)
+        if not is_entry_point(executable):
+            return None
+        main_class = executable[:-len('.java')]
+        return ['javac -d out $(find . -name "*.java")'], ["java", "-cp", "out", main_class]
+    
+    return None
+
+def assemble_dockerfile(base_image, commands, cmd, is_interactive=False, expose=()):
+    """Write out a Dockerfile following the generation rules (WORKDIR /app, COPY . .)"""
+    lines = [f"FROM {base_image}", "WORKDIR /app", "COPY . ."]
+    lines.extend("RUN " + command for command in commands)
+    lines.extend(f"EXPOSE {port}" for port in expose)
+    if is_interactive:
+        lines.append("# Interactive program: run it with docker run -it")
+    lines.append("CMD " + json.dumps(cmd))
+    return "\n".join(lines)
+
+def assemble_structured_dockerfile(generated_text):
+    """Validate a structured generation (see DOCKERFILE_SCHEMA) and assemble its Dockerfile
+
+    Raises ValueError when the output is not valid JSON or a field is unusable.
+    """
     try:
-        with open(makefile_path, 'r') as f:
-            content = f.read()
-            
-        # Method 1: Look for TARGET variable (like your example)
-        target_match = re.search(r'^TARGET\s*=\s*(\w+)', content, re.MULTILINE)
-        if target_match:
-            return target_match.group(1)
-        
-        # Method 2: Look for variables that might be executables
-        exe_patterns = [
-            r'^PROGRAM\s*=\s*(\w+)',
-            r'^EXECUTABLE\s*=\s*(\w+)',
-            r'^BINARY\s*=\s*(\w+)',
-            r'^OUTPUT\s*=\s*(\w+)',
-        ]
-        for pattern in exe_patterns:
-            match = re.search(pattern, content, re.MULTILINE)
-            if match:
-                return match.group(1)
-        
-        # Method 3: Look for -o flag in compilation commands
-        output_match = re.search(r'-o\s+(\$\((\w+)\)|\w+)', content)
-        if output_match:
-            if output_match.group(2):  # Variable like $(TARGET)
-                # Find what this variable equals
-                var_name = output_match.group(2)
-                var_match = re.search(rf'^{var_name}\s*=\s*(\w+)', content, re.MULTILINE)
-                if var_match:
-                    return var_match.group(1)
-            else:  # Direct name
-                return output_match.group(1)
-        
-        # Method 4: Look for first meaningful target (original logic)
-        lines = content.split('\n')
-        skip_targets = {'clean', 'install', 'all', 'run', 'help', 'test', 'distclean', 'check'}
-        
-        for line in lines:
-            line = line.strip()
-            if not line or line.startswith('#'):
+        fields = json.loads(generated_text)
+    except ValueError:
+        raise ValueError("the response is not valid JSON")
+    if not isinstance(fields, dict):
+        raise ValueError("the response is not a JSON object")
+    
+    base_image = fields.get('base_image')
+    if not isinstance(base_image, str) or not DOCKER_IMAGE_RE.match(base_image.strip()):
+        raise ValueError(f"invalid base image {base_image!r}")
+    
+    commands = []
+    for field in ('dependency_commands', 'build_commands'):
+        values = fields.get(field) or []
+        if not isinstance(values, list) or not all(isinstance(v, str) for v in values):
+            raise ValueError(f"{field} is not a list of commands")
+        # The model sometimes repeats the instruction name inside the command
+        for value in values:
+            command = ' '.join(value.split())
+            if command.upper().startswith('RUN '):
+                command = command[4:]
+            if command:
+                commands.append(command)
+    
+    cmd = fields.get('cmd')
+    if not isinstance(cmd, list) or not cmd or not all(isinstance(v, str) and v for v in cmd):
+        raise ValueError(f"invalid cmd {cmd!r}")
+    
+    expose = fields.get('expose') or []
+    if not isinstance(expose, list) or not all(isinstance(p, int) and 0 < p < 65536 for p in expose):
+        raise ValueError(f"invalid exposed ports {expose!r}")
+    
+    return assemble_dockerfile(base_image.strip(), commands, cmd, expose=expose)
+
+def render_dockerfile_template(project_info):
+    """Render the Dockerfile of a well-understood project without the LLM, None when unsure"""
+    if project_info['type'] not in DOCKERFILE_BASE_IMAGES:
+        return None
+    steps = template_build_steps(project_info)
+    if steps is None:
+        return None
+    commands, cmd = steps
+    return assemble_dockerfile(DOCKERFILE_BASE_IMAGES[project_info['type']], commands, cmd,
+                               project_info.get('is_interactive'))
+
+# Makefile directives and variables used to find the executable target
+MAKEFILE_INCLUDE_RE = re.compile(r'^[ \t]*(?:-|s)?include[ \t]+(.+)$', re.MULTILINE)
+MAKEFILE_EXECUTABLE_VARS = [
+    re.compile(rf'^{name}\s*=\s*(\w+)', re.MULTILINE)
+    for name in ('TARGET', 'PROGRAM', 'EXECUTABLE', 'BINARY', 'OUTPUT')
+]
+MAKEFILE_OUTPUT_FLAG_RE = re.compile(r'-o\s+(\$\((\w+)\)|\w+)')
+MAKEFILE_SKIP_TARGETS = {'clean', 'install', 'all', 'run', 'help', 'test', 'distclean', 'check'}
+
+GO_MODULE_RE = re.compile(r'^module\s+(\S+)', re.MULTILINE)
+GO_VERSION_RE = re.compile(r'^go\s+(\S+)', re.MULTILINE)
+POM_PARENT_RE = re.compile(r'<parent>.*?</parent>', re.DOTALL)
+POM_ARTIFACT_ID_RE = re.compile(r'<artifactId>\s*([^<\s]+)\s*</artifactId>')
+POM_PACKAGING_RE = re.compile(r'<packaging>\s*([^<\s]+)\s*</packaging>')
+GRADLE_MAIN_CLASS_RE = re.compile(r'mainClass(?:Name)?\s*(?:=|\.set\()\s*[\'"]([\w.$]+)[\'"]')
+TOML_ARRAY_TABLE_RE = re.compile(r'^\[\[\s*([\w.-]+)\s*\]\]$')
+TOML_TABLE_RE = re.compile(r'^\[\s*([\w.-]+)\s*\]$')
+TOML_STRING_RE = re.compile(r'^([\w-]+|"[^"]+")\s*=\s*"([^"]*)"')
+
+def read_makefile(makefile_path, seen=None):
+    """Return a Makefile's content with include/-include/sinclude directives expanded, and the included files"""
+    seen = seen if seen is not None else set()
+    seen.add(os.path.realpath(makefile_path))
+    with open(makefile_path, 'r', encoding='utf-8', errors='ignore') as f:
+        content = f.read()
+    
+    included = []
+    def expand(match):
+        parts = []
+        for name in match.group(1).split():
+            # Variables and wildcards can't be resolved without running make
+            if '$' in name or any(c in name for c in '*?['):
                 continue
-                
-            if ':' in line and not line.startswith('\t'):
-                target = line.split(':')[0].strip()
-                
-                # Skip special targets and variables
-                if target.startswith('.') or target in skip_targets:
-                    continue
-                
-                # Skip if it looks like a variable assignment
-                if '=' in target:
-                    continue
-                
-                # This is probably our main executable target
-                return target
-                
-    except Exception:
-        pass
+            include_path = os.path.join(os.path.dirname(makefile_path), name)
+            if os.path.realpath(include_path) in seen or not os.path.isfile(include_path):
+                continue
+            include_content, include_files = read_makefile(include_path, seen)
+            included.append(include_path)
+            included.extend(include_files)
+            parts.append(include_content)
+        return '\n'.join(parts)
     
-    return None
+    return MAKEFILE_INCLUDE_RE.sub(expand, content), included
 
-def determine_project_is_interactive(dest_path):
-    """Determine if the project is interactive based on code inside each file"""
-    
-    # Interactive patterns for each language
-    interactive_patterns = {
-        'python': [
-            r'input\s*\(',
-            r'raw_input\s*\(',
-            r'sys\.stdin\.read',
-            r'getpass\.getpass',
-            r'click\.prompt',
-        ],
-        'javascript': [
-            r'readline\.',
-            r'process\.stdin',
-            r'prompt\s*\(',
-            r'confirm\s*\(',
-            r'inquirer\.',
-            r'\.question\s*\(',
-        ],
-        'typescript': [
-            r'readline\.',
-            r'process\.stdin',
-            r'prompt\s*\(',
-            r'confirm\s*\(',
-            r'inquirer\.',
-            r'\.question\s*\(',
-        ],
-        'c': [
-            r'scanf\s*\(',
-            r'getchar\s*\(',
-            r'gets\s*\(',
-            r'fgets\s*\(',
-            r'getc\s*\(',
-        ],
-        'cpp': [
-            r'cin\s*>>',
-            r'getline\s*\(',
-            r'scanf\s*\(',
-            r'getchar\s*\(',
-            r'std::cin',
-            r'gets\s*\(',
-        ],
-        'java': [
-            r'Scanner\s*\(',
-            r'\.nextLine\s*\(',
-            r'\.next\s*\(',
-            r'\.nextInt\s*\(',
-            r'System\.in',
-            r'BufferedReader',
-            r'Console\.readLine',
-        ],
-        'go': [
-            r'fmt\.Scan',
-            r'bufio\.NewReader',
-            r'os\.Stdin',
-            r'fmt\.Scanf',
-            r'reader\.ReadString',
-        ],
-        'rust': [
-            r'stdin\s*\(',
-            r'read_line\s*\(',
-            r'io::stdin',
-            r'stdin\.read_line',
-        ]
-    }
+def find_makefile_target(content):
+    """Find the main executable target in (expanded) Makefile content"""
+    # Method 1 and 2: TARGET, then other variables that might be executables
+    for pattern in MAKEFILE_EXECUTABLE_VARS:
+        match = pattern.search(content)
+        if match:
+            return match.group(1)
     
-    # File extensions mapping
-    file_extensions = {
-        '.py': 'python',
-        '.js': 'javascript', 
-        '.ts': 'typescript',
-        '.c': 'c',
-        '.cpp': 'cpp',
-        '.cc': 'cpp',
-        '.cxx': 'cpp',
-        '.java': 'java',
-        '.go': 'go',
-        '.rs': 'rust'
-    }
+    # Method 3: Look for -o flag in compilation commands
+    output_match = MAKEFILE_OUTPUT_FLAG_RE.search(content)
+    if output_match:
+        if output_match.group(2):  # Variable like $(TARGET)
+            # Find what this variable equals
+            var_name = output_match.group(2)
+            var_match = re.search(rf'^{var_name}\s*=\s*(\w+)', content, re.MULTILINE)
+            if var_match:
+                return var_match.group(1)
+        else:  # Direct name
+            return output_match.group(1)
     
-    # Search through all source files
-    for root, dirs, files in os.walk(dest_path):
-        # Skip node_modules and other irrelevant directories
-        if 'node_modules' in root or '.git' in root:
+    # Method 4: Look for first meaningful target (original logic)
+    for line in content.split('\n'):
+        line = line.strip()
+        if not line or line.startswith('#'):
             continue
             
-        for file in files:
-            file_path = os.path.join(root, file)
-            file_ext = os.path.splitext(file)[1].lower()
+        if ':' in line and not line.startswith('\t'):
+            target = line.split(':')[0].strip()
+            
+            # Skip special targets and variables
+            if target.startswith('.') or target in MAKEFILE_SKIP_TARGETS:
+                continue
             
-            # Skip if not a source file we care about
-            if file_ext not in file_extensions:
+            # Skip if it looks like a variable assignment
+            if '=' in target:
                 continue
-                
-            language = file_extensions[file_ext]
-            patterns = interactive_patterns.get(language, [])
             
+            # This is probably our main executable target
+            return target
+    
+    return None
+
+def parse_simple_toml(text):
+    """Minimal TOML reader for Python < 3.11: tables, arrays of tables and string values"""
+    data = {}
+    current = data
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        
+        match = TOML_ARRAY_TABLE_RE.match(line)
+        if match:
+            *parents, last = match.group(1).split('.')
+            table = data
+            for key in parents:
+                table = table.setdefault(key, {})
+            current = {}
+            table.setdefault(last, []).append(current)
+            continue
+        
+        match = TOML_TABLE_RE.match(line)
+        if match:
+            current = data
+            for key in match.group(1).split('.'):
+                current = current.setdefault(key, {})
+            continue
+        
+        match = TOML_STRING_RE.match(line)
+        if match:
+            current[match.group(1).strip('"')] = match.group(2)
+    return data
+
+def parse_toml(text):
+    if tomllib is None:
+        return parse_simple_toml(text)
+    try:
+        return tomllib.loads(text)
+    except tomllib.TOMLDecodeError:
+        return {}
+
+def parse_manifest(name, path):
+    """Parse one build manifest into the fields the analysis needs"""
+    if name == 'Makefile':
+        content, included = read_makefile(path)
+        # Included files are re-checked before a cached parse is reused
+        includes = []
+        for include_path in included:
+            stat = os.stat(include_path)
+            includes.append([include_path, stat.st_mtime_ns, stat.st_size])
+        return {'target': find_makefile_target(content), 'includes': includes}
+    
+    with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+        content = f.read()
+    
+    if name == 'package.json':
+        try:
+            data = json.loads(content)
+        except ValueError:
+            data = {}
+        if not isinstance(data, dict):
+            data = {}
+        return {
+            'name': data.get('name'),
+            'main': data.get('main'),
+            'scripts': data.get('scripts') or {},
+            'dependencies': len(data.get('dependencies') or {}) + len(data.get('devDependencies') or {})
+        }
+    if name == 'requirements.txt':
+        requirements = [line.strip() for line in content.splitlines()
+                        if line.strip() and not line.strip().startswith('#')]
+        return {'requirements': len(requirements)}
+    if name == 'pyproject.toml':
+        data = parse_toml(content)
+        project = data.get('project') or {}
+        poetry = (data.get('tool') or {}).get('poetry') or {}
+        return {
+            'name': project.get('name') or poetry.get('name'),
+            'scripts': project.get('scripts') or poetry.get('scripts') or {},
+            'build_backend': (data.get('build-system') or {}).get('build-backend')
+        }
+    if name == 'go.mod':
+        module = GO_MODULE_RE.search(content)
+        version = GO_VERSION_RE.search(content)
+        return {
+            'module': module.group(1) if module else None,
+            'go': version.group(1) if version else None
+        }
+    if name == 'Cargo.toml':
+        data = parse_toml(content)
+        return {
+            'name': (data.get('package') or {}).get('name'),
+            'bins': [b['name'] for b in data.get('bin') or [] if isinstance(b, dict) and b.get('name')]
+        }
+    if name == 'pom.xml':
+        content = POM_PARENT_RE.sub('', content)
+        artifact_id = POM_ARTIFACT_ID_RE.search(content)
+        packaging = POM_PACKAGING_RE.search(content)
+        return {
+            'artifact_id': artifact_id.group(1) if artifact_id else None,
+            'packaging': packaging.group(1) if packaging else 'jar'
+        }
+    if name in ('build.gradle', 'build.gradle.kts'):
+        main_class = GRADLE_MAIN_CLASS_RE.search(content)
+        return {'main_class': main_class.group(1) if main_class else None}
+    return {}
+
+def load_manifest(name, entry, dest_path, file_cache=None):
+    """Parse a manifest, reusing the cached parse if neither it nor its includes changed"""
+    record = file_cache.get(entry) if file_cache is not None else None
+    if record is not None and record['manifest'] is not None:
+        parsed = json.loads(record['manifest'])
+        includes_unchanged = True
+        for path, mtime_ns, size in parsed.get('includes', []):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                stat = None
+            if stat is None or (stat.st_mtime_ns, stat.st_size) != (mtime_ns, size):
+                includes_unchanged = False
+        if includes_unchanged:
+            return parsed
+    
+    parsed = parse_manifest(name, entry.path)
+    parsed['path'] = os.path.relpath(entry.path, dest_path).replace(os.sep, '/')
+    if record is not None:
+        file_cache.update(entry, manifest=json.dumps(parsed))
+    return parsed
+
+def build_manifest_index(dest_path, manifest_entries, file_cache=None):
+    """Parse every build manifest of the project once into a structured record
+    
+    manifest_entries maps a manifest file name to the entries found by the walk.
+    When a manifest appears several times the shallowest one describes the project.
+    """
+    parsed = {}
+    for name, entries in manifest_entries.items():
+        parsed[name] = []
+        for entry in sorted(entries, key=lambda e: (e.path.count(os.sep), e.path)):
             try:
-                with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-                    content = f.read()
-                    
-                    # Check for interactive patterns
-                    for pattern in patterns:
-                        if re.search(pattern, content, re.IGNORECASE):
-                            return {
-                                'is_interactive': True,
-                                'reason': f'Found interactive pattern "{pattern}" in {file}',
-                                'file': file,
-                                'language': language
-                            }
-                            
-            except Exception as e:
-                # Skip files that can't be read
+                parsed[name].append(load_manifest(name, entry, dest_path, file_cache))
+            except Exception:
+                # Skip manifests that can't be read or parsed
                 continue
     
+    def first(name):
+        return parsed[name][0] if parsed.get(name) else None
+    
+    # The Makefile only counts at the project root, where `make` would run
+    makefile = first('Makefile')
+    if makefile is not None and makefile['path'] != 'Makefile':
+        makefile = None
+    
+    java = None
+    if first('pom.xml'):
+        java = dict(first('pom.xml'), build_tool='maven')
+    elif first('build.gradle') or first('build.gradle.kts'):
+        java = dict(first('build.gradle') or first('build.gradle.kts'), build_tool='gradle')
+    
     return {
-        'is_interactive': False,
-        'reason': 'No interactive patterns found',
-        'file': None,
-        'language': None
+        'makefile': makefile,
+        'package_json': first('package.json'),
+        'tsconfig': first('tsconfig.json'),
+        'python': {
+            'requirements': [m['path'] for m in parsed.get('requirements.txt', [])],
+            'pyproject': first('pyproject.toml')
+        },
+        'go_mod': first('go.mod'),
+        'cargo': first('Cargo.toml'),
+        'java': java
     }
 
-def main():
-    inputs_dir = "inputs"
-    traitement_dir = "outputs"
+# Interactive patterns for each language
+INTERACTIVE_PATTERNS = {
+    'python': [
+        r'input\s*\(',
+        r'raw_input\s*\(',
+        r'sys\.stdin\.read',
+        r'getpass\.getpass',
+        r'click\.prompt',
+    ],
+    'javascript': [
+        r'readline\.',
+        r'process\.stdin',
+        r'prompt\s*\(',
+        r'confirm\s*\(',
+        r'inquirer\.',
+        r'\.question\s*\(',
+    ],
+    'typescript': [
+        r'readline\.',
+        r'process\.stdin',
+        r'prompt\s*\(',
+        r'confirm\s*\(',
+        r'inquirer\.',
+        r'\.question\s*\(',
+    ],
+    'c': [
+        r'scanf\s*\(',
+        r'getchar\s*\(',
+        r'gets\s*\(',
+        r'fgets\s*\(',
+        r'getc\s*\(',
+    ],
+    'cpp': [
+        r'cin\s*>>',
+        r'getline\s*\(',
+        r'scanf\s*\(',
+        r'getchar\s*\(',
+        r'std::cin',
+        r'gets\s*\(',
+    ],
+    'java': [
+        r'Scanner\s*\(',
+        r'\.nextLine\s*\(',
+        r'\.next\s*\(',
+        r'\.nextInt\s*\(',
+        r'System\.in',
+        r'BufferedReader',
+        r'Console\.readLine',
+    ],
+    'go': [
+        r'fmt\.Scan',
+        r'bufio\.NewReader',
+        r'os\.Stdin',
+        r'fmt\.Scanf',
+        r'reader\.ReadString',
+    ],
+    'rust': [
+        r'stdin\s*\(',
+        r'read_line\s*\(',
+        r'io::stdin',
+        r'stdin\.read_line',
+    ]
+}
+
+# File extensions mapping
+INTERACTIVE_FILE_EXTENSIONS = {
+    '.py': 'python',
+    '.js': 'javascript', 
+    '.ts': 'typescript',
+    '.c': 'c',
+    '.cpp': 'cpp',
+    '.cc': 'cpp',
+    '.cxx': 'cpp',
+    '.java': 'java',
+    '.go': 'go',
+    '.rs': 'rust'
+}
+
+# Each language's patterns compiled once into a single alternation over bytes,
+# with one named group per pattern so a match tells which pattern fired
+INTERACTIVE_MATCHERS = {
+    language: re.compile(
+        b'|'.join(b'(?P<p%d>%s)' % (i, pattern.encode()) for i, pattern in enumerate(patterns)),
+        re.IGNORECASE)
+    for language, patterns in INTERACTIVE_PATTERNS.items()
+}
+
+# Files are scanned in bounded chunks; the overlap keeps matches that straddle
+# a chunk boundary, and files above the mmap threshold are searched in place
+SCAN_CHUNK_SIZE = 1024 * 1024
+SCAN_CHUNK_OVERLAP = 256
+SCAN_MMAP_THRESHOLD = 8 * 1024 * 1024
+
+# Number of threads reading source files during the interactive scan (1 = serial)
+INTERACTIVE_SCAN_THREADS = 8
+
+def find_interactive_pattern(file_path, language):
+    """Return the first interactive pattern found in a file, or '' if there is none"""
+    matcher = INTERACTIVE_MATCHERS[language]
+    match = None
     
-    # Create traitement directory
-    if not os.path.exists(traitement_dir):
-        os.makedirs(traitement_dir)
+    with open(file_path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size >= SCAN_MMAP_THRESHOLD:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                match = matcher.search(mapped)
+        else:
+            tail = b''
+            while match is None:
+                chunk = f.read(SCAN_CHUNK_SIZE)
+                if not chunk:
+                    break
+                window = tail + chunk
+                match = matcher.search(window)
+                tail = window[-SCAN_CHUNK_OVERLAP:]
     
-    # List all project directories
-    projects = os.listdir(inputs_dir)
+    if match is None:
+        return ''
+    return INTERACTIVE_PATTERNS[language][int(match.lastgroup[1:])]
+
+def determine_project_is_interactive(dest_path, file_cache=None, threads=INTERACTIVE_SCAN_THREADS):
+    """Determine if the project is interactive based on code inside each file
     
-    all_project_analyses = []
+    Source files are read concurrently by a thread pool. Once a file matches,
+    files that come after it in walk order are cancelled, and the earliest match
+    wins, so the result is the same as a serial scan.
+    """
     
-    for project in projects:
-        project_path = os.path.join(inputs_dir, project)
+    # Collect source files in walk order, stopping at the first cached match
+    candidates = []
+    for entry in iter_project_files(dest_path):
+        file_ext = os.path.splitext(entry.name)[1].lower()
         
-        # Skip if not a directory
-        if not os.path.isdir(project_path):
+        # Skip if not a source file we care about
+        if file_ext not in INTERACTIVE_FILE_EXTENSIONS:
             continue
-            
-        # move project to traitement
-        dest_path = os.path.join(traitement_dir, project)
-        if os.path.exists(dest_path):
-            shutil.rmtree(dest_path)
-        shutil.copytree(project_path, dest_path)
         
-        # Analyze project files
-        file_analysis = analyze_project_files(dest_path)
+        record = file_cache.get(entry) if file_cache is not None else None
+        candidates.append((entry, INTERACTIVE_FILE_EXTENSIONS[file_ext], record))
+        if record is not None and record['interactive']:
+            break
+    
+    first_match = [len(candidates)]
+    lock = threading.Lock()
+    
+    def scan(index):
+        entry, language, record = candidates[index]
         
-        # Determine project type and generate LLM context
-        project_info = determine_project_type(project, file_analysis)
+        # Reuse the result of a previous scan if the file is unchanged
+        if record is not None and record['interactive'] is not None:
+            return record['interactive']
         
-        # Check if project is interactive
-        interactive_info = determine_project_is_interactive(dest_path)
-        project_info['is_interactive'] = interactive_info['is_interactive']
-        project_info['interactive_reason'] = interactive_info['reason']
+        # An earlier file already matched, this one cannot change the result
+        if index > first_match[0]:
+            return None
         
-        # Determine executable name for Makefile projects
-        if project_info.get('build_system') == 'Makefile':
-            makefile_target = parse_makefile_target(dest_path)
-            if makefile_target:
-                project_info['executable_name'] = makefile_target
-            else:
-                # Fallback: use first source file without extension
-                first_file = project_info['files'].split(', ')[0] if project_info['files'] else ''
-                project_info['executable_name'] = os.path.splitext(first_file)[0] if first_file else 'a.out'
+        try:
+            pattern = find_interactive_pattern(entry.path, language)
+        except Exception:
+            # Skip files that can't be read
+            return None
+        
+        if pattern:
+            with lock:
+                first_match[0] = min(first_match[0], index)
+        return pattern
+    
+    results = {}
+    if threads > 1 and len(candidates) > 1:
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            futures = {executor.submit(scan, index): index for index in range(len(candidates))}
+            for future in as_completed(futures):
+                if future.cancelled() or not future.result():
+                    continue
+                # Cancel every file queued after the match
+                for other, index in futures.items():
+                    if index > futures[future]:
+                        other.cancel()
+            for future, index in futures.items():
+                if not future.cancelled():
+                    results[index] = future.result()
+    else:
+        for index in range(len(candidates)):
+            results[index] = scan(index)
+            if results[index]:
+                break
+    
+    # Remember scan results for unchanged files
+    for index, pattern in results.items():
+        entry, language, record = candidates[index]
+        if pattern is not None and record is not None and record['interactive'] is None:
+            file_cache.update(entry, interactive=pattern)
+    
+    matches = [index for index, pattern in results.items() if pattern]
+    if matches:
+        entry, language, record = candidates[min(matches)]
+        return {
+            'is_interactive': True,
+            'reason': f'Found interactive pattern "{results[min(matches)]}" in {entry.name}',
+            'file': entry.name,
+            'language': language
+        }
+    
+    return {
+        'is_interactive': False,
+        'reason': 'No interactive patterns found',
+        'file': None,
+        'language': None
+    }
+
+def reflink_file(src, dst):
+    """Copy-on-write clone of a file (Linux FICLONE); returns False where the filesystem can't do it"""
+    if fcntl is None:
+        return False
+    device = os.stat(os.path.dirname(os.path.abspath(dst))).st_dev
+    if REFLINK_SUPPORT.get(device) is False:
+        return False
+    try:
+        with open(src, 'rb') as source, open(dst, 'wb') as target:
+            fcntl.ioctl(target.fileno(), FICLONE, source.fileno())
+    except OSError:
+        REFLINK_SUPPORT[device] = False
+        if os.path.exists(dst):
+            os.remove(dst)
+        return False
+    REFLINK_SUPPORT[device] = True
+    shutil.copystat(src, dst)
+    return True
+
+def link_or_copy(src, dst):
+    """copytree copy_function: reflink, else hard link, else a plain copy"""
+    # Files the pipeline writes into the workspace must never share an inode with the input
+    if os.path.basename(dst) in GENERATED_FILES:
+        return shutil.copy2(src, dst)
+    if reflink_file(src, dst):
+        return dst
+    try:
+        os.link(src, dst)
+        return dst
+    except OSError:
+        return shutil.copy2(src, dst)
+
+def stage_project(project_path, dest_path, mode=STAGING_MODE):
+    """Materialize a project's build workspace in the traitement directory
+    
+    'move' renames the project, 'link' mirrors its tree with reflinks or hard
+    links (copying per file only when neither works) and 'copy' copies every byte.
+    """
+    if os.path.exists(dest_path):
+        shutil.rmtree(dest_path)
+    if mode == "move":
+        shutil.move(project_path, dest_path)
+    elif mode == "link":
+        shutil.copytree(project_path, dest_path, symlinks=True, copy_function=link_or_copy)
+    else:
+        shutil.copytree(project_path, dest_path)
+
+def analyze_project(project, inputs_dir="inputs", traitement_dir="outputs"):
+    """Analyze one project in place, then stage it into the traitement directory
+    
+    A project that can't be analyzed or staged returns {'project_name', 'error'}
+    so the rest of the batch goes on.
+    """
+    project_path = os.path.join(inputs_dir, project)
+    dest_path = os.path.join(traitement_dir, project)
+    
+    try:
+        cache = open_analysis_cache()
+        try:
+            project_info = _analyze_project(project, project_path, cache)
+        finally:
+            cache.close()
+        
+        stage_project(project_path, dest_path)
+    except Exception as e:
+        return {'project_name': project, 'error': f"analysis failed: {str(e)}"}
+    return project_info
+
+def _analyze_project(project, project_path, cache):
+    # Skip the whole analysis if the project is unchanged since the last recorded run
+    file_cache = FileCache(cache, project_path)
+    fingerprint = compute_project_fingerprint(project_path, file_cache)
+    previous_run = load_project_run(cache, project, fingerprint)
+    # A run recorded by record_project_run alone has no stored analysis, analyze the project again
+    if previous_run is not None and previous_run.get('project_info') is not None:
+        file_cache.save()
+        project_info = previous_run.pop('project_info')
+        project_info['fingerprint'] = fingerprint
+        project_info['previous_run'] = previous_run
+        return project_info
+    
+    # Analyze project files, reusing cached results for unchanged files
+    file_analysis = analyze_project_files(project_path, file_cache)
+    
+    # Determine project type and generate LLM context
+    project_info = determine_project_type(project, file_analysis)
+    project_info['project_name'] = project
+    project_info['manifests'] = manifests = file_analysis['manifests']
+    
+    # Ranked sample of the main language's files (relative paths)
+    language_analysis = file_analysis.get(project_info['type'], {'files': [], 'count': 0})
+    project_info['file_list'] = language_analysis['files']
+    project_info['file_count'] = language_analysis['count']
+    
+    # Every language with source files, most files first (more than one = mixed project)
+    project_info['languages'] = sorted((language for language in set(LANGUAGE_EXTENSIONS.values())
+                                        if file_analysis[language]['count'] > 0),
+                                       key=lambda language: (-file_analysis[language]['count'], language))
+    
+    # Check if project is interactive
+    interactive_info = determine_project_is_interactive(project_path, file_cache)
+    project_info['is_interactive'] = interactive_info['is_interactive']
+    project_info['interactive_reason'] = interactive_info['reason']
+    file_cache.save()
+    
+    # Determine executable name for Makefile projects
+    if project_info.get('build_system') == 'Makefile':
+        makefile_target = manifests['makefile']['target']
+        if makefile_target:
+            project_info['executable_name'] = makefile_target
         else:
-            # For non-Makefile projects, determine executable based on language
-            files_list = [f.strip() for f in project_info['files'].split(', ')] if project_info['files'] else []
-            
-            if project_info['type'] == 'typescript':
-                # Filter out .d.ts files (type definitions), prefer main TypeScript files
-                ts_files = [f for f in files_list if f.endswith('.ts') and not f.endswith('.d.ts')]
-                if ts_files:
-                    # Look for index.ts, main.ts, or app.ts first
-                    for priority_file in ['index.ts', 'main.ts', 'app.ts']:
-                        if priority_file in ts_files:
-                            project_info['executable_name'] = priority_file
-                            break
-                    else:
-                        # Use first non-.d.ts TypeScript file
-                        project_info['executable_name'] = ts_files[0]
+            # Fallback: use first source file without extension
+            first_file = project_info['file_list'][0] if project_info['file_list'] else ''
+            project_info['executable_name'] = os.path.splitext(os.path.basename(first_file))[0] if first_file else 'a.out'
+    else:
+        # For non-Makefile projects, determine executable based on language
+        files_list = project_info['file_list']
+        
+        if project_info['type'] == 'typescript':
+            # Filter out .d.ts files (type definitions), prefer main TypeScript files
+            ts_files = [f for f in files_list if f.endswith('.ts') and not f.endswith('.d.ts')]
+            if ts_files:
+                # Look for index.ts, main.ts, or app.ts first
+                for priority_file in ['index.ts', 'main.ts', 'app.ts']:
+                    matches = [f for f in ts_files if os.path.basename(f) == priority_file]
+                    if matches:
+                        project_info['executable_name'] = matches[0]
+                        break
                 else:
-                    project_info['executable_name'] = files_list[0] if files_list else 'index.ts'
-            
-            elif project_info['type'] == 'java':
-                # For Java, use class name WITH extension
-                if files_list:
-                    # Look for Main, App, or similar
-                    for file in files_list:
-                        if 'main' in file.lower() or 'app' in file.lower():
-                            project_info['executable_name'] = file  # keep .java
-                            break
-                    else:
-                        # Use first Java file WITH extension
-                        project_info['executable_name'] = files_list[0]
+                    # Use first non-.d.ts TypeScript file
+                    project_info['executable_name'] = ts_files[0]
+            else:
+                project_info['executable_name'] = files_list[0] if files_list else 'index.ts'
+        
+        elif project_info['type'] == 'java':
+            # For Java, use class name WITH extension
+            if files_list:
+                # Look for Main, App, or similar
+                for file in files_list:
+                    if 'main' in os.path.basename(file).lower() or 'app' in os.path.basename(file).lower():
+                        project_info['executable_name'] = file  # keep .java
+                        break
                 else:
-                    project_info['executable_name'] = 'Main.java'
-
-            
-            elif project_info['type'] == 'go':
-                # Go executable is typically the directory name or 'main'
-                project_info['executable_name'] = 'main'
-            
-            elif project_info['type'] == 'python':
-                # Python runs the .py file directly
-                project_info['executable_name'] = files_list[0] if files_list else 'main.py'
-            
-            elif project_info['type'] in ['javascript', 'typescript']:
-                # Node.js runs the .js/.ts file directly
-                project_info['executable_name'] = files_list[0] if files_list else 'index.js'
-            
+                    # Use first Java file WITH extension
+                    project_info['executable_name'] = files_list[0]
             else:
-                # Default fallback
-                project_info['executable_name'] = files_list[0] if files_list else 'main'
+                project_info['executable_name'] = 'Main.java'
+
         
-        # Create comprehensive description for LLM
-        dependency_info = ""
-        if project_info['has_dependencies']:
-            dependency_info = f" with {project_info['dependency_file']}"
-        else:
-            dependency_info = " without dependencies"
-            
-        interactive_status = "interactive" if project_info['is_interactive'] else "non-interactive"
+        elif project_info['type'] == 'go':
+            # Go executable is typically the directory name or 'main'
+            project_info['executable_name'] = 'main'
+        
+        elif project_info['type'] == 'python':
+            # Python runs the .py file directly
+            project_info['executable_name'] = files_list[0] if files_list else 'main.py'
         
-        # Build system information for the description
-        build_system_info = ""
-        if project_info.get('build_system') == 'Makefile':
-            build_system_info = "\n- Build system: Makefile (use 'make' to compile)"
-        elif project_info.get('dependency_file'):
-            if project_info['dependency_file'] == 'package.json':
-                build_system_info = "\n- Build system: npm/yarn (use 'npm install' for dependencies)"
-            elif project_info['dependency_file'] == 'requirements.txt':
-                build_system_info = "\n- Build system: pip (use 'pip install -r requirements.txt' for dependencies)"
+        elif project_info['type'] == 'javascript' and manifests['package_json'] and manifests['package_json']['main']:
+            # package.json declares the entry point
+            project_info['executable_name'] = manifests['package_json']['main']
+        
+        elif project_info['type'] == 'rust' and manifests['cargo'] and manifests['cargo']['name']:
+            # Cargo names the binary after the package, or its first [[bin]] target
+            cargo = manifests['cargo']
+            project_info['executable_name'] = cargo['bins'][0] if cargo['bins'] else cargo['name']
+        
+        elif project_info['type'] in ['javascript', 'typescript']:
+            # Node.js runs the .js/.ts file directly
+            project_info['executable_name'] = files_list[0] if files_list else 'index.js'
+        
+        else:
+            # Default fallback
+            project_info['executable_name'] = files_list[0] if files_list else 'main'
+    
+    # Create comprehensive description for LLM
+    dependency_info = ""
+    if project_info['has_dependencies']:
+        dependency_info = f" with {project_info['dependency_file']}"
+    else:
+        dependency_info = " without dependencies"
         
-        # Build the complete description that will be sent to LLM
-        project_info['description'] = f"""The project '{project}':
+    interactive_status = "interactive" if project_info['is_interactive'] else "non-interactive"
+    
+    # Build system information for the description
+    build_system_info = ""
+    if project_info.get('build_system') == 'Makefile':
+        build_system_info = "\n- Build system: Makefile (use 'make' to compile)"
+    elif project_info.get('dependency_file'):
+        if project_info['dependency_file'] == 'package.json':
+            build_system_info = "\n- Build system: npm/yarn (use 'npm install' for dependencies)"
+        elif project_info['dependency_file'] == 'requirements.txt':
+            build_system_info = "\n- Build system: pip (use 'pip install -r requirements.txt' for dependencies)"
+        elif project_info['dependency_file'] == 'go.mod':
+            build_system_info = "\n- Build system: Go modules (use 'go build' to compile)"
+        elif project_info['dependency_file'] == 'Cargo.toml':
+            build_system_info = "\n- Build system: Cargo (use 'cargo build --release' to compile)"
+        elif project_info['dependency_file'] == 'pom.xml':
+            build_system_info = "\n- Build system: Maven (use 'mvn package' to build)"
+        elif project_info['dependency_file'] in ('build.gradle', 'build.gradle.kts'):
+            build_system_info = "\n- Build system: Gradle (use 'gradle build' to build)"
+    
+    # Build the complete description that will be sent to LLM
+    project_info['description'] = f"""The project '{project}':
 - Language: {project_info['type'].upper()}
 - Files inside the project: {project_info['files']}
 - Main executable: {project_info['executable_name']}
 - Dependencies: {dependency_info}
 - Interactive: {interactive_status}
 - Dependency file exists: {'YES' if project_info['has_dependencies'] else 'NO'}{build_system_info}"""
-        
-        # Print for immediate feedback (keep the old format for console output)
-        makefile_status = " with Makefile" if project_info.get('build_system') == 'Makefile' else ""
-        print(f"{project}: {project_info['type']} project{dependency_info}{makefile_status}, files: {project_info['files']}, executable: {project_info['executable_name']}, {interactive_status}")
-        print(f"{project}: {project_info['description']}")
+    
+    # Record the analysis so an unchanged project can skip straight to its stored result
+    save_project_run(cache, project, fingerprint, {'project_info': project_info})
+    project_info['fingerprint'] = fingerprint
+    return project_info
+
+def print_project_summary(project_info):
+    """Print the analysis of one project"""
+    project = project_info['project_name']
+    if 'error' in project_info:
+        print(f"{project}: {project_info['error']}")
+        return
+    if project_info.get('previous_run') is not None:
+        print(f"{project}: unchanged since the last run (fingerprint {project_info['fingerprint'][:12]}), reusing stored analysis")
+        return
+    
+    # Keep the old format for console output
+    dependency_info = f" with {project_info['dependency_file']}" if project_info['has_dependencies'] else " without dependencies"
+    makefile_status = " with Makefile" if project_info.get('build_system') == 'Makefile' else ""
+    interactive_status = "interactive" if project_info['is_interactive'] else "non-interactive"
+    print(f"{project}: {project_info['type']} project{dependency_info}{makefile_status}, files: {project_info['files']}, executable: {project_info['executable_name']}, {interactive_status}")
+    print(f"{project}: {project_info['description']}")
 
-        # Store for LLM usage
-        all_project_analyses.append(project_info)
+def iter_analyses(workers=ANALYSIS_WORKERS):
+    """Yield each project's analysis as soon as it is ready, in project order
     
-    return all_project_analyses
+    With more than one worker every project is submitted to the process pool
+    up front, so later projects keep being analyzed while the caller works on
+    the ones already yielded.
+    """
+    inputs_dir = "inputs"
+    traitement_dir = "outputs"
+    
+    # Create traitement directory
+    if not os.path.exists(traitement_dir):
+        os.makedirs(traitement_dir)
+    
+    # List all project directories, in a stable order
+    projects = [p for p in sorted(os.listdir(inputs_dir)) if os.path.isdir(os.path.join(inputs_dir, p))]
+    
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(projects))
+    
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers,
+                                 mp_context=multiprocessing.get_context(ANALYSIS_START_METHOD)) as executor:
+            # map() submits everything now and yields results in project order
+            for project_info in executor.map(analyze_project, projects,
+                                             [inputs_dir] * len(projects), [traitement_dir] * len(projects)):
+                print_project_summary(project_info)
+                yield project_info
+    else:
+        for project in projects:
+            project_info = analyze_project(project, inputs_dir, traitement_dir)
+            print_project_summary(project_info)
+            yield project_info
+
+def main(workers=ANALYSIS_WORKERS):
+    # Store every analysis for LLM usage
+    return list(iter_analyses(workers))
 
 if __name__ == "__main__":
     start_listening()